@@ -1,20 +1,29 @@
 from dagster import Definitions
 from .assets import (
+    relationships_workbook_cache,
     user_relationships_table, 
     actors_table, 
     actor_relationships_view,
+    actor_graph_metrics,
 )
 from .schedules import daily_relationships_update_schedule
-from .resources import mysql_etl_resource
+from .sensors import relationships_file_sensor
+from .resources import mysql_etl_resource, mysql_bulk_loader_resource
+from .io_managers import mmap_io_manager
 
 defs = Definitions(
     assets=[
+        relationships_workbook_cache,
         user_relationships_table, 
         actors_table, 
-        actor_relationships_view
+        actor_relationships_view,
+        actor_graph_metrics,
     ],
     schedules=[daily_relationships_update_schedule],
+    sensors=[relationships_file_sensor],
     resources={
-        "mysql_conn": mysql_etl_resource
+        "mysql_conn": mysql_etl_resource,
+        "bulk_loader": mysql_bulk_loader_resource,
+        "mmap_io_manager": mmap_io_manager,
     }
 )
\ No newline at end of file
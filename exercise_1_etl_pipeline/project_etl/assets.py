@@ -1,17 +1,180 @@
-import pandas as pd
-import numpy as np
-from dagster import asset, DagsterInvariantViolationError, AssetIn
+import hashlib
+
+from dagster import asset, DagsterInvariantViolationError, AssetIn, Field, Output, Enum, EnumValue, Noneable
 from sqlalchemy import text
 
+from .cache import (
+    DEFAULT_EXCEL_PATH, DEFAULT_CACHE_DIR,
+    fingerprint_archivo, cache_vigente, guardar_cache, rutas_cache,
+)
+from .graph import calcular_metricas
+from .loaders import cargar_relaciones_incremental, cargar_actores_incremental
+from .profiling import StageTimer
+from .readers import (
+    escanear_matriz_excel, escanear_matriz_excel_paralelo,
+    pares_a_relaciones, relaciones_triangulo_superior, leer_actores_excel, RELATIONSHIP_READERS,
+)
+from .resources import metricas_db
+
+MATRIX_SHEET_NAME = "Matriz de adyacencia"
+ACTORS_SHEET_NAME = "Lista de actores"
+
+# Configuración común a los assets que cargan tablas desde el Excel.
+LOAD_CONFIG_SCHEMA = {
+    "incremental": Field(
+        bool,
+        default_value=False,
+        description="Si es True, aplica solo las diferencias contra la tabla actual en lugar de TRUNCATE + recarga completa.",
+    ),
+    "load_strategy": Field(
+        Enum("LoadStrategy", [EnumValue(strategy) for strategy in ("to_sql", "executemany", "load_data")]),
+        default_value="to_sql",
+        description="Estrategia del bulk loader para la carga completa (to_sql, executemany o load_data).",
+    ),
+}
+
+# --- ASSET 0: Caché columnar del Excel (relaciones.xlsx -> Arrow) ---
+@asset(
+    group_name="relationships",
+    description="Convierte las dos hojas de relaciones.xlsx a Arrow una sola vez por versión del archivo (hash SHA-256).",
+    io_manager_key="mmap_io_manager",
+    config_schema={
+        "excel_path": Field(str, default_value=DEFAULT_EXCEL_PATH),
+        "cache_dir": Field(str, default_value=DEFAULT_CACHE_DIR),
+        "parallel_workers": Field(
+            int,
+            default_value=1,
+            description="Procesos para leer la matriz por bloques de filas (1 = lectura en serie).",
+        ),
+        "rows_per_block": Field(
+            Noneable(int),
+            default_value=None,
+            description="Filas por bloque en modo paralelo (por defecto, un bloque por proceso).",
+        ),
+        "relationships_source": Field(
+            Enum("RelationshipSource", [EnumValue(source) for source in ("excel", *RELATIONSHIP_READERS)]),
+            default_value="excel",
+            description=(
+                "Origen de las relaciones: la matriz del Excel, una lista de relaciones en CSV o Parquet "
+                "(columnas person_a, person_b) o una matriz dispersa .npz de SciPy."
+            ),
+        ),
+        "relationships_path": Field(
+            Noneable(str),
+            default_value=None,
+            description="Ruta del archivo de relaciones cuando relationships_source no es 'excel'.",
+        ),
+    },
+    compute_kind="python"
+)
+def relationships_workbook_cache(context):
+    excel_path = context.op_config["excel_path"]
+    cache_dir = context.op_config["cache_dir"]
+    source = context.op_config["relationships_source"]
+    source_path = context.op_config["relationships_path"]
+    if source != "excel" and not source_path:
+        raise DagsterInvariantViolationError(f"relationships_source='{source}' requiere relationships_path.")
+    timer = StageTimer()
+
+    with timer.stage("fingerprint"):
+        fingerprint = fingerprint_archivo(excel_path)
+        if source != "excel":
+            # El caché depende de ambos archivos: la lista de actores (Excel) y las relaciones.
+            fingerprint = hashlib.sha256(
+                f"{fingerprint}:{source}:{fingerprint_archivo(source_path)}".encode()
+            ).hexdigest()
+    if cache_vigente(cache_dir, fingerprint):
+        # Los archivos no cambiaron desde la última conversión: no se vuelven a parsear.
+        context.log.info(f"Las fuentes no cambiaron (sha256={fingerprint[:12]}). Se reutiliza el caché en '{cache_dir}'.")
+        paths = rutas_cache(cache_dir)
+        return Output(
+            {"fingerprint": fingerprint, **paths},
+            metadata={"sha256": fingerprint, "cache_hit": True, **timer.metadata()},
+        )
+
+    if source != "excel":
+        context.log.info(f"Leyendo las relaciones desde '{source_path}' ({source})")
+        try:
+            with timer.stage("extract_edges") as stage:
+                relationships_df = RELATIONSHIP_READERS[source](source_path)
+                stage["rows"] = len(relationships_df)
+
+        except Exception as e:
+            raise DagsterInvariantViolationError(
+                f"Error al leer las relaciones de '{source_path}' ({source}). Error: {e}"
+            )
+    else:
+        context.log.info(f"Leyendo la matriz desde la hoja: '{MATRIX_SHEET_NAME}'")
+        relationships_df = extraer_matriz_excel(context, timer, excel_path)
+
+    context.log.info(f"Leyendo la lista de actores desde la hoja '{ACTORS_SHEET_NAME}'")
+    try:
+        with timer.stage("extract_actors") as stage:
+            actors_df = leer_actores_excel(excel_path, ACTORS_SHEET_NAME)
+            stage["rows"] = len(actors_df)
+        context.log.info("Se estandarizaron los 'letter_code' a mayúsculas.")
+
+    except Exception as e:
+        raise DagsterInvariantViolationError(f"Error al leer la hoja '{ACTORS_SHEET_NAME}'. Asegúrate de que exista. Error: {e}")
+
+    with timer.stage("write_arrow") as stage:
+        paths = guardar_cache(cache_dir, fingerprint, relationships_df, actors_df)
+        stage["rows"] = len(relationships_df) + len(actors_df)
+    context.log.info(f"Caché actualizado en '{cache_dir}' (sha256={fingerprint[:12]}).")
+
+    return Output(
+        {"fingerprint": fingerprint, **paths},
+        metadata={
+            "sha256": fingerprint,
+            "cache_hit": False,
+            "relationships": len(relationships_df),
+            "actors": len(actors_df),
+            **timer.metadata(),
+        },
+    )
+
+def extraer_matriz_excel(context, timer, excel_path):
+    """Lee la hoja de la matriz de adyacencia (en serie o por bloques en paralelo) y devuelve la lista de relaciones."""
+    try:
+        # Lectura en streaming: solo se guardan las celdas con valor 1, nunca la matriz N x N.
+        workers = context.op_config["parallel_workers"]
+        with timer.stage("extract_matrix") as stage:
+            if workers > 1:
+                ids, posiciones = escanear_matriz_excel_paralelo(
+                    excel_path, MATRIX_SHEET_NAME, workers, context.op_config["rows_per_block"]
+                )
+            else:
+                ids, posiciones = escanear_matriz_excel(excel_path, MATRIX_SHEET_NAME)
+            stage["rows"] = len(ids)
+        with timer.stage("transform_edges") as stage:
+            if workers > 1:
+                # Los bloques ya llegan en orden: basta con quedarse con el triángulo superior.
+                relationships_df = relaciones_triangulo_superior(ids, posiciones)
+            else:
+                relationships_df = pares_a_relaciones(ids, posiciones)
+            stage["rows"] = len(posiciones)
+
+    except Exception as e:
+        raise DagsterInvariantViolationError(
+            f"Error al leer o procesar la hoja '{MATRIX_SHEET_NAME}'. "
+            f"Revisa la estructura del archivo. Error: {e}"
+        )
+
+    return relationships_df
+
 # --- ASSET 1: Tabla de Relaciones (user_relationships) ---
 @asset(
     group_name="relationships",
-    description="Lee la matriz de relaciones, la transforma y la carga en MySQL.",
-    required_resource_keys={"mysql_conn"},
+    description="Lee la lista de relaciones del caché columnar (memory-map) y la carga en MySQL.",
+    required_resource_keys={"mysql_conn", "bulk_loader"},
+    ins={"workbook": AssetIn(key="relationships_workbook_cache")},
+    config_schema=LOAD_CONFIG_SCHEMA,
     compute_kind="python"
 )
-def user_relationships_table(context):
+def user_relationships_table(context, workbook):
     engine = context.resources.mysql_conn
+    db_start = metricas_db(engine).snapshot()
+    timer = StageTimer()
     table_name = "user_relationships"
 
     create_table_query = f"""
@@ -25,74 +188,45 @@ def user_relationships_table(context):
     with engine.connect() as conn:
         conn.execute(text(create_table_query))
 
-    excel_path = "/opt/dagster/app/data/relaciones.xlsx"
-    sheet_name = "Matriz de adyacencia"
-    context.log.info(f"Leyendo la matriz desde la hoja: '{sheet_name}'")
-
-    try:
-
-        # 1. Lee la hoja entera sin asumir estructura.
-        df_raw = pd.read_excel(excel_path, sheet_name=sheet_name, header=None)
-        
-        # 2. Extrae la lista de todos los IDs numéricos válidos de la primera columna (columna A).
-        all_ids = pd.to_numeric(df_raw.iloc[2:, 0], errors='coerce').dropna().astype(int)
-
-        # 3. Extrae solo el bloque de datos numéricos (desde la celda C3 en adelante).
-        data_block = df_raw.iloc[2:, 2:].copy()
-        
-        # 4. Crea una matriz cuadrada vacía, usando all_ids para el índice y las columnas.
-        df_matrix = pd.DataFrame(index=all_ids, columns=all_ids)
-        
-        # 5. Rellena la matriz cuadrada con los datos del Excel.
-        # Recorta los datos y los índices para que coincidan en tamaño
-        valid_rows = all_ids[:len(data_block)]
-        valid_cols = all_ids[:len(data_block.columns)]
-        
-        # Asigna los datos a la subsección correspondiente de la matriz cuadrada.
-        df_matrix.loc[valid_rows, valid_cols] = data_block.values
-
-        # 6. Convierte toda la matriz a tipo numérico para estandarizarla.
-        df_matrix = df_matrix.apply(pd.to_numeric, errors='coerce')
-
-    except Exception as e:
-        raise DagsterInvariantViolationError(
-            f"Error al leer o procesar la hoja '{sheet_name}'. "
-            f"Revisa la estructura del archivo. Error: {e}"
-        )
-
-    context.log.info(f"Matriz procesada. Forma final: {df_matrix.shape}")
-    
-    context.log.info("Transformando matriz a lista de relaciones...")
-    
-    stacked = df_matrix.stack()
-    relationships_series = stacked[stacked == 1]
-    
-    relationships_df = relationships_series.index.to_frame(index=False, name=["person_a", "person_b"])
-    relationships_df = relationships_df[relationships_df['person_a'] != relationships_df['person_b']]
-    
-    sorted_pairs = np.sort(relationships_df.values, axis=1)
-    final_df = pd.DataFrame(sorted_pairs, columns=["person_a", "person_b"]).drop_duplicates()
-
+    # Cargado por mmap_io_manager con memory-map desde el caché Arrow.
+    final_df = workbook["relationships"]
     context.log.info(f"Se encontraron {len(final_df)} relaciones únicas.")
 
-    with engine.connect() as conn:
+    with timer.stage("load") as stage, engine.connect() as conn:
+        stage["rows"] = len(final_df)
         with conn.begin():
-            conn.execute(text(f"TRUNCATE TABLE {table_name}"))
-            if not final_df.empty:
-                final_df.to_sql(table_name, con=conn, if_exists="append", index=False)
-            context.log.info(f"Tabla '{table_name}' actualizada con {len(final_df)} registros.")
-    
-    return table_name
+            if context.op_config["incremental"]:
+                # Solo se escriben las diferencias; las filas sin cambios conservan su updated_at.
+                metadata = cargar_relaciones_incremental(conn, table_name, final_df)
+                context.log.info(f"Tabla '{table_name}' actualizada de forma incremental: {metadata}")
+            else:
+                conn.execute(text(f"TRUNCATE TABLE {table_name}"))
+                load_stats = context.resources.bulk_loader.load(
+                    conn, table_name, final_df, strategy=context.op_config["load_strategy"]
+                )
+                metadata = {"inserted": len(final_df), **load_stats}
+                context.log.info(
+                    f"Tabla '{table_name}' actualizada con {len(final_df)} registros "
+                    f"({load_stats['load_strategy']}: {load_stats['rows_per_sec']} filas/s)."
+                )
+
+    metadata.update(metricas_db(engine).metadata_since(db_start))
+    metadata.update(timer.metadata())
+    return Output(table_name, metadata=metadata)
 
 # --- ASSET 2: Tabla de Actores (actors) ---
 @asset(
     group_name="relationships",
-    description="Lee la lista de actores y la carga en la tabla 'actors'.",
-    required_resource_keys={"mysql_conn"},
+    description="Lee la lista de actores del caché columnar (memory-map) y la carga en la tabla 'actors'.",
+    required_resource_keys={"mysql_conn", "bulk_loader"},
+    ins={"workbook": AssetIn(key="relationships_workbook_cache")},
+    config_schema=LOAD_CONFIG_SCHEMA,
     compute_kind="python"
 )
-def actors_table(context):
+def actors_table(context, workbook):
     engine = context.resources.mysql_conn
+    db_start = metricas_db(engine).snapshot()
+    timer = StageTimer()
     table_name = "actors"
 
     # Definimos el esquema de la nueva tabla
@@ -107,63 +241,61 @@ def actors_table(context):
     with engine.connect() as conn:
         conn.execute(text(create_table_query))
 
-    excel_path = "/opt/dagster/app/data/relaciones.xlsx"
-    sheet_name = "Lista de actores"
-    context.log.info(f"Leyendo la lista de actores desde la hoja '{sheet_name}'")
-
-    try:
-        # Leemos los datos, saltando las primeras 4 filas y usando solo las columnas A, B, C
-        df = pd.read_excel(
-            excel_path,
-            sheet_name=sheet_name,
-            header=None,       
-            skiprows=4,        
-            usecols="A:C"      
-        )
-        # Nombramos las columnas
-        df.columns = ["letter_code", "numeric_id", "actor_name"]
-        
-        # Limpieza de datos
-        df.dropna(how="all", inplace=True) # Eliminar filas completamente vacías
-        df['numeric_id'] = df['numeric_id'].astype(int) # Asegurar que el ID es un número entero
-
-        # Convierte todos los códigos a mayúsculas para asegurar consistencia
-        df['letter_code'] = df['letter_code'].str.upper()
-        context.log.info("Se estandarizaron los 'letter_code' a mayúsculas.")
-
-    except Exception as e:
-        raise DagsterInvariantViolationError(f"Error al leer la hoja '{sheet_name}'. Asegúrate de que exista. Error: {e}")
-
+    df = workbook["actors"]
     context.log.info(f"Se encontraron {len(df)} actores.")
 
     # Cargamos los datos en la base de datos
-    with engine.connect() as conn:
+    with timer.stage("load") as stage, engine.connect() as conn:
+        stage["rows"] = len(df)
         with conn.begin():
-            conn.execute(text(f"TRUNCATE TABLE {table_name}"))
-            if not df.empty:
-                df.to_sql(table_name, con=conn, if_exists="append", index=False)
-            context.log.info(f"Tabla '{table_name}' actualizada con {len(df)} registros.")
-    
-    return table_name
+            if context.op_config["incremental"]:
+                # Solo se escriben las diferencias; las filas sin cambios conservan su updated_at.
+                metadata = cargar_actores_incremental(conn, table_name, df)
+                context.log.info(f"Tabla '{table_name}' actualizada de forma incremental: {metadata}")
+            else:
+                conn.execute(text(f"TRUNCATE TABLE {table_name}"))
+                load_stats = context.resources.bulk_loader.load(
+                    conn, table_name, df, strategy=context.op_config["load_strategy"]
+                )
+                metadata = {"inserted": len(df), **load_stats}
+                context.log.info(
+                    f"Tabla '{table_name}' actualizada con {len(df)} registros "
+                    f"({load_stats['load_strategy']}: {load_stats['rows_per_sec']} filas/s)."
+                )
+
+    metadata.update(metricas_db(engine).metadata_since(db_start))
+    metadata.update(timer.metadata())
+    return Output(table_name, metadata=metadata)
 
 # --- ASSET 3: Vista Combinada (v_actor_relationships) ---
 @asset(
     group_name="relationships",
-    description="Crea una vista en MySQL para unir las relaciones con los nombres de los actores.",
+    description=(
+        "Crea una vista en MySQL para unir las relaciones con los nombres de los actores. "
+        "Opcionalmente la materializa como tabla indexada por person_b_id."
+    ),
     required_resource_keys={"mysql_conn"},
     # Definimos las dependencias: este asset se ejecuta DESPUÉS de los otros dos.
     ins={"user_relationships": AssetIn(key="user_relationships_table"),
          "actors": AssetIn(key="actors_table")},
+    config_schema={
+        "materialize": Field(
+            bool,
+            default_value=False,
+            description="Si es True, además de la vista construye una tabla desnormalizada con índice en person_b_id.",
+        ),
+        "materialized_table_name": Field(str, default_value="actor_relationships"),
+    },
     compute_kind="mysql"
 )
 def actor_relationships_view(context, user_relationships, actors):
     engine = context.resources.mysql_conn
+    db_start = metricas_db(engine).snapshot()
+    timer = StageTimer()
     view_name = "v_actor_relationships"
 
-    # La consulta SQL para crear la vista
     # Hacemos un doble JOIN a la tabla de actores para obtener el nombre de person_a y person_b
-    create_view_query = f"""
-    CREATE OR REPLACE VIEW {view_name} AS
+    select_query = f"""
     SELECT
         ur.person_a AS person_a_id,
         act_a.letter_code AS person_a_letter,
@@ -176,11 +308,150 @@ def actor_relationships_view(context, user_relationships, actors):
     JOIN
         {actors} act_a ON ur.person_a = act_a.numeric_id
     JOIN
-        {actors} act_b ON ur.person_b = act_b.numeric_id;
+        {actors} act_b ON ur.person_b = act_b.numeric_id
     """
-    
+
+    # La consulta SQL para crear la vista
+    create_view_query = f"CREATE OR REPLACE VIEW {view_name} AS {select_query};"
+
     context.log.info(f"Creando o reemplazando la vista '{view_name}'...")
-    with engine.connect() as conn:
+    with timer.stage("create_view"), engine.connect() as conn:
         conn.execute(text(create_view_query))
     context.log.info("Vista creada exitosamente.")
 
+    metadata = {"view": view_name}
+    if context.op_config["materialize"]:
+        with timer.stage("materialize") as stage:
+            metadata.update(
+                materializar_relaciones(context, engine, context.op_config["materialized_table_name"], select_query)
+            )
+            stage["rows"] = metadata["materialized_rows"]
+
+    metadata.update(metricas_db(engine).metadata_since(db_start))
+    metadata.update(timer.metadata())
+    return Output(view_name, metadata=metadata)
+
+
+def materializar_relaciones(context, engine, table_name, select_query):
+    """
+    Construye la versión materializada de la vista en una tabla nueva y la intercambia con la
+    actual mediante RENAME TABLE, que es atómico: los lectores ven la tabla anterior o la nueva,
+    nunca una a medio construir.
+    """
+    new_table = f"{table_name}_new"
+    old_table = f"{table_name}_old"
+
+    create_table_query = f"""
+    CREATE TABLE {new_table} (
+        person_a_id INT NOT NULL,
+        person_a_letter VARCHAR(5) NOT NULL,
+        person_a_name VARCHAR(255) NOT NULL,
+        person_b_id INT NOT NULL,
+        person_b_letter VARCHAR(5) NOT NULL,
+        person_b_name VARCHAR(255) NOT NULL,
+        PRIMARY KEY (person_a_id, person_b_id),
+        INDEX idx_person_b_id (person_b_id)
+    );
+    """
+
+    context.log.info(f"Materializando la vista en la tabla '{table_name}'...")
+    # En MySQL cada DDL hace commit implícito; el INSERT ... SELECT se confirma antes del RENAME.
+    with engine.begin() as conn:
+        # Restos de una ejecución previa interrumpida.
+        conn.execute(text(f"DROP TABLE IF EXISTS {new_table}, {old_table}"))
+        conn.execute(text(create_table_query))
+        rows = conn.execute(text(f"INSERT INTO {new_table} {select_query}")).rowcount
+
+        table_exists = conn.execute(
+            text(
+                "SELECT COUNT(*) FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = :table_name"
+            ),
+            {"table_name": table_name},
+        ).scalar()
+        if table_exists:
+            conn.execute(text(f"RENAME TABLE {table_name} TO {old_table}, {new_table} TO {table_name}"))
+            conn.execute(text(f"DROP TABLE {old_table}"))
+        else:
+            conn.execute(text(f"RENAME TABLE {new_table} TO {table_name}"))
+
+    context.log.info(f"Tabla '{table_name}' materializada con {rows} registros.")
+    return {"materialized_table": table_name, "materialized_rows": rows}
+
+
+# --- ASSET 4: Métricas de grafo por actor (actor_graph_metrics) ---
+@asset(
+    group_name="relationships",
+    description=(
+        "Construye la adyacencia CSR a partir de las relaciones y calcula por actor el grado, "
+        "la componente conexa y la distancia BFS a los actores semilla."
+    ),
+    required_resource_keys={"mysql_conn", "bulk_loader"},
+    ins={"workbook": AssetIn(key="relationships_workbook_cache"),
+         "user_relationships": AssetIn(key="user_relationships_table")},
+    config_schema={
+        "seed_actors": Field(
+            [int],
+            default_value=[],
+            description="numeric_id de los actores desde los que se calcula la distancia en saltos.",
+        ),
+        "load_strategy": LOAD_CONFIG_SCHEMA["load_strategy"],
+    },
+    compute_kind="numpy"
+)
+def actor_graph_metrics(context, workbook, user_relationships):
+    engine = context.resources.mysql_conn
+    db_start = metricas_db(engine).snapshot()
+    timer = StageTimer()
+    table_name = "actor_graph_metrics"
+
+    create_table_query = f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        actor_id INT PRIMARY KEY NOT NULL,
+        degree INT NOT NULL,
+        component_id INT NOT NULL,
+        component_size INT NOT NULL,
+        seed_distance INT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    );
+    """
+    with engine.connect() as conn:
+        conn.execute(text(create_table_query))
+
+    # Las relaciones llegan mapeadas en memoria desde el caché Arrow, sin volver a consultar MySQL.
+    relationships_df = workbook["relationships"]
+    actors_df = workbook["actors"]
+
+    seed_actors = context.op_config["seed_actors"]
+    with timer.stage("compute") as stage:
+        metrics_df = calcular_metricas(
+            relationships_df["person_a"],
+            relationships_df["person_b"],
+            actor_ids=actors_df["numeric_id"],
+            seed_actors=seed_actors,
+        )
+        stage["rows"] = len(relationships_df)
+    components = int(metrics_df["component_id"].nunique())
+    context.log.info(f"Métricas calculadas para {len(metrics_df)} actores en {components} componentes.")
+
+    with timer.stage("load") as stage, engine.connect() as conn:
+        stage["rows"] = len(metrics_df)
+        with conn.begin():
+            conn.execute(text(f"TRUNCATE TABLE {table_name}"))
+            load_stats = context.resources.bulk_loader.load(
+                conn, table_name, metrics_df, strategy=context.op_config["load_strategy"]
+            )
+    context.log.info(f"Tabla '{table_name}' actualizada con {len(metrics_df)} registros.")
+
+    return Output(
+        table_name,
+        metadata={
+            "actors": len(metrics_df),
+            "components": components,
+            "largest_component": int(metrics_df["component_size"].max()) if len(metrics_df) else 0,
+            "seed_actors": len(seed_actors),
+            **load_stats,
+            **metricas_db(engine).metadata_since(db_start),
+            **timer.metadata(),
+        },
+    )
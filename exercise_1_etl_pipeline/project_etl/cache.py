@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+
+import pyarrow as pa
+from pyarrow import feather
+from openpyxl import load_workbook
+
+# Ruta del Excel compartida por el asset (valor por defecto de excel_path) y el sensor de archivos.
+DEFAULT_EXCEL_PATH = os.getenv("RELATIONSHIPS_EXCEL_PATH", "/opt/dagster/app/data/relaciones.xlsx")
+# El caché vive en el volumen compartido de dagster_home para sobrevivir entre runs y contenedores.
+DEFAULT_CACHE_DIR = os.path.join(os.getenv("DAGSTER_HOME", "/opt/dagster/dagster_home"), "cache", "relaciones")
+
+FINGERPRINT_FILE = "fingerprint.json"
+# Arrow IPC sin compresión: se puede abrir con memory-map y leer sin copiar.
+RELATIONSHIPS_FILE = "relationships.arrow"
+ACTORS_FILE = "actors.arrow"
+
+
+def fingerprint_archivo(path, chunk_size=1024 * 1024):
+    """SHA-256 del contenido del archivo, leído por bloques."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(chunk_size), b""):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def rutas_cache(cache_dir):
+    return {
+        "relationships_path": os.path.join(cache_dir, RELATIONSHIPS_FILE),
+        "actors_path": os.path.join(cache_dir, ACTORS_FILE),
+    }
+
+
+def cache_vigente(cache_dir, fingerprint):
+    """True si el caché fue generado a partir de un archivo con el mismo hash y sus archivos existen."""
+    fingerprint_path = os.path.join(cache_dir, FINGERPRINT_FILE)
+    if not os.path.exists(fingerprint_path):
+        return False
+    with open(fingerprint_path) as f:
+        guardado = json.load(f)
+    return guardado.get("sha256") == fingerprint and all(
+        os.path.exists(path) for path in rutas_cache(cache_dir).values()
+    )
+
+
+def escribir_arrow(df, path):
+    # Escritura atómica: un lector nunca ve un archivo a medio escribir.
+    tmp_path = f"{path}.tmp"
+    feather.write_feather(df.reset_index(drop=True), tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def guardar_cache(cache_dir, fingerprint, relationships_df, actors_df):
+    os.makedirs(cache_dir, exist_ok=True)
+    rutas = rutas_cache(cache_dir)
+    escribir_arrow(relationships_df, rutas["relationships_path"])
+    escribir_arrow(actors_df, rutas["actors_path"])
+
+    # El fingerprint se escribe al final: si la conversión falla, el caché queda invalidado.
+    with open(os.path.join(cache_dir, FINGERPRINT_FILE), "w") as f:
+        json.dump({"sha256": fingerprint}, f)
+    return rutas
+
+
+def leer_arrow(path):
+    """
+    Abre un archivo Arrow IPC con memory-map: el sistema operativo carga las páginas bajo demanda y
+    las columnas numéricas sin nulos se exponen a pandas sin copiarse.
+    """
+    # El archivo no se cierra explícitamente: los buffers de la tabla mantienen vivo el mapeo.
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def fingerprint_hojas(path, sheet_names):
+    """
+    SHA-256 del contenido (valores de celda) de cada hoja, para detectar qué hoja cambió.
+    Se hashean los valores y no el archivo: guardar el Excel sin cambios altera sus bytes, pero no estos hashes.
+    """
+    fingerprints = {}
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet_name in sheet_names:
+            sha = hashlib.sha256()
+            if sheet_name in workbook.sheetnames:
+                for fila in workbook[sheet_name].iter_rows(values_only=True):
+                    sha.update(repr(fila).encode("utf-8"))
+                    sha.update(b"\n")
+            fingerprints[sheet_name] = sha.hexdigest()
+    finally:
+        workbook.close()
+    return fingerprints
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+
+def construir_csr(person_a, person_b, actor_ids=None):
+    """
+    Construye la matriz de adyacencia (no dirigida) en formato CSR a partir de la lista de relaciones.
+    Los IDs se compactan a posiciones 0..N-1; se devuelve también el arreglo de IDs por posición.
+    Los actores sin relaciones (actor_ids) se incluyen como nodos aislados.
+    """
+    person_a = np.asarray(person_a, dtype=np.int64)
+    person_b = np.asarray(person_b, dtype=np.int64)
+    extra = np.asarray(actor_ids if actor_ids is not None else [], dtype=np.int64)
+
+    ids = np.unique(np.concatenate([person_a, person_b, extra]))
+    origen = np.searchsorted(ids, person_a)
+    destino = np.searchsorted(ids, person_b)
+
+    # Cada relación se agrega en ambos sentidos para que el grafo sea simétrico.
+    filas = np.concatenate([origen, destino])
+    columnas = np.concatenate([destino, origen])
+    datos = np.ones(len(filas), dtype=np.int8)
+
+    n = len(ids)
+    adyacencia = sparse.csr_matrix((datos, (filas, columnas)), shape=(n, n))
+    # Relaciones repetidas se suman al construir la matriz; solo interesa la conectividad.
+    adyacencia.data[:] = 1
+    return adyacencia, ids
+
+
+def distancias_bfs(adyacencia, semillas):
+    """
+    BFS multi-origen vectorizado sobre la CSR: en cada nivel se expanden todos los nodos de la
+    frontera a la vez. Devuelve la distancia (en saltos) a la semilla más cercana, o -1 si no es alcanzable.
+    """
+    indptr, indices = adyacencia.indptr, adyacencia.indices
+    distancias = np.full(adyacencia.shape[0], -1, dtype=np.int32)
+
+    frontera = np.unique(np.asarray(semillas, dtype=np.int64))
+    distancias[frontera] = 0
+    nivel = 0
+    while frontera.size:
+        nivel += 1
+        inicios = indptr[frontera]
+        longitudes = indptr[frontera + 1] - inicios
+        total = longitudes.sum()
+        if total == 0:
+            break
+        # Posiciones en 'indices' de todos los vecinos de la frontera, sin bucles de Python.
+        desplazamientos = np.repeat(inicios - np.cumsum(longitudes) + longitudes, longitudes)
+        vecinos = indices[desplazamientos + np.arange(total)]
+        frontera = np.unique(vecinos[distancias[vecinos] < 0])
+        distancias[frontera] = nivel
+    return distancias
+
+
+def calcular_metricas(person_a, person_b, actor_ids=None, seed_actors=None):
+    """
+    Calcula por actor: grado, componente conexa (ID y tamaño) y, si se indican actores semilla,
+    la distancia en saltos a la semilla más cercana.
+    """
+    adyacencia, ids = construir_csr(person_a, person_b, actor_ids)
+
+    grados = np.diff(adyacencia.indptr)
+    _, componentes = connected_components(adyacencia, directed=False)
+    tamanos = np.bincount(componentes)
+
+    metricas = pd.DataFrame({
+        "actor_id": ids,
+        "degree": grados,
+        "component_id": componentes,
+        "component_size": tamanos[componentes],
+    })
+
+    if seed_actors and len(ids):
+        semillas = np.asarray(seed_actors, dtype=np.int64)
+        posiciones = np.searchsorted(ids, semillas)
+        encontradas = (posiciones < len(ids)) & (ids[np.minimum(posiciones, len(ids) - 1)] == semillas)
+        distancias = distancias_bfs(adyacencia, posiciones[encontradas])
+        # -1 (no alcanzable) se guarda como NULL.
+        metricas["seed_distance"] = pd.Series(distancias, dtype="Int64").mask(distancias < 0)
+    else:
+        metricas["seed_distance"] = pd.Series([pd.NA] * len(ids), dtype="Int64")
+
+    return metricas
@@ -0,0 +1,66 @@
+import json
+import os
+
+import pandas as pd
+from dagster import IOManager, io_manager, Field
+
+from .cache import escribir_arrow, leer_arrow
+
+DEFAULT_BASE_DIR = os.path.join(os.getenv("DAGSTER_HOME", "/opt/dagster/dagster_home"), "storage_mmap")
+ARROW_SUFFIX = ".arrow"
+PATH_SUFFIX = "_path"
+
+
+class MmapArrowIOManager(IOManager):
+    """
+    IO manager para intercambiar datos entre assets sin pasar por MySQL.
+
+    - DataFrames: se guardan como Arrow IPC sin compresión en el volumen de dagster_home y se
+      cargan con memory-map, sin copiar las columnas numéricas.
+    - Otros valores (nombres de tabla, manifiestos de rutas): se guardan como JSON. Si el valor es un
+      dict con claves "<nombre>_path" que apuntan a archivos .arrow (p. ej. el caché del Excel),
+      al cargarlo se agrega "<nombre>" con el DataFrame mapeado en memoria.
+    """
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+
+    def _ruta(self, context, suffix):
+        return os.path.join(self.base_dir, *context.asset_key.path) + suffix
+
+    def handle_output(self, context, obj):
+        os.makedirs(self.base_dir, exist_ok=True)
+        if isinstance(obj, pd.DataFrame):
+            path = self._ruta(context, ARROW_SUFFIX)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            escribir_arrow(obj, path)
+            context.add_output_metadata({"mmap_path": path, "rows": len(obj)})
+            return
+
+        path = self._ruta(context, ".json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(obj, f)
+
+    def load_input(self, context):
+        upstream = context.upstream_output
+        arrow_path = self._ruta(upstream, ARROW_SUFFIX)
+        if os.path.exists(arrow_path):
+            return leer_arrow(arrow_path)
+
+        with open(self._ruta(upstream, ".json")) as f:
+            value = json.load(f)
+        if isinstance(value, dict):
+            for key, path in list(value.items()):
+                if key.endswith(PATH_SUFFIX) and isinstance(path, str) and path.endswith(ARROW_SUFFIX):
+                    value[key[:-len(PATH_SUFFIX)]] = leer_arrow(path)
+        return value
+
+
+@io_manager(
+    config_schema={
+        "base_dir": Field(str, default_value=DEFAULT_BASE_DIR, description="Directorio compartido para los archivos."),
+    }
+)
+def mmap_io_manager(init_context):
+    return MmapArrowIOManager(init_context.resource_config["base_dir"])
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# Número de filas por cada executemany en la carga incremental.
+BATCH_SIZE = 10_000
+
+
+def _claves_pares(person_a, person_b):
+    """Empaqueta cada par (person_a, person_b) en un único int64 para comparar conjuntos con numpy."""
+    person_a = np.asarray(person_a, dtype=np.int64)
+    person_b = np.asarray(person_b, dtype=np.int64)
+    return (person_a << 32) | (person_b & 0xFFFFFFFF)
+
+
+def _ejecutar_en_lotes(conn, query, registros):
+    for inicio in range(0, len(registros), BATCH_SIZE):
+        conn.execute(text(query), registros[inicio:inicio + BATCH_SIZE])
+
+
+def cargar_relaciones_incremental(conn, table_name, df):
+    """
+    Aplica solo la diferencia entre las relaciones extraídas y el contenido actual de la tabla:
+    inserta las nuevas, borra las que desaparecieron y no toca las que no cambiaron
+    (por lo que su updated_at se conserva).
+    """
+    actuales = pd.read_sql(text(f"SELECT person_a, person_b FROM {table_name}"), conn)
+
+    claves_nuevas = _claves_pares(df["person_a"], df["person_b"])
+    claves_actuales = _claves_pares(actuales["person_a"], actuales["person_b"])
+
+    a_insertar = df[~np.isin(claves_nuevas, claves_actuales)]
+    a_borrar = actuales[~np.isin(claves_actuales, claves_nuevas)]
+
+    _ejecutar_en_lotes(
+        conn,
+        f"INSERT INTO {table_name} (person_a, person_b) VALUES (:person_a, :person_b)",
+        a_insertar.astype(int).to_dict("records"),
+    )
+    _ejecutar_en_lotes(
+        conn,
+        f"DELETE FROM {table_name} WHERE person_a = :person_a AND person_b = :person_b",
+        a_borrar.astype(int).to_dict("records"),
+    )
+
+    return {
+        "inserted": len(a_insertar),
+        "deleted": len(a_borrar),
+        "unchanged": len(df) - len(a_insertar),
+    }
+
+
+def cargar_actores_incremental(conn, table_name, df):
+    """
+    UPSERT de actores por numeric_id: solo se envían las filas nuevas o modificadas
+    y se borran los actores que ya no aparecen en el Excel.
+    """
+    columnas = ["numeric_id", "letter_code", "actor_name"]
+    actuales = pd.read_sql(text(f"SELECT {', '.join(columnas)} FROM {table_name}"), conn)
+
+    comparacion = df[columnas].merge(
+        actuales, on="numeric_id", how="outer", suffixes=("", "_actual"), indicator=True
+    )
+    nuevos = comparacion["_merge"] == "left_only"
+    eliminados = comparacion["_merge"] == "right_only"
+    en_ambos = comparacion["_merge"] == "both"
+    modificados = en_ambos & (
+        (comparacion["letter_code"] != comparacion["letter_code_actual"])
+        | (comparacion["actor_name"] != comparacion["actor_name_actual"])
+    )
+
+    a_upsert = comparacion.loc[nuevos | modificados, columnas]
+    a_upsert = a_upsert.astype({"numeric_id": int})
+    _ejecutar_en_lotes(
+        conn,
+        f"""
+        INSERT INTO {table_name} (numeric_id, letter_code, actor_name)
+        VALUES (:numeric_id, :letter_code, :actor_name)
+        ON DUPLICATE KEY UPDATE
+            letter_code = VALUES(letter_code),
+            actor_name = VALUES(actor_name)
+        """,
+        a_upsert.to_dict("records"),
+    )
+    _ejecutar_en_lotes(
+        conn,
+        f"DELETE FROM {table_name} WHERE numeric_id = :numeric_id",
+        comparacion.loc[eliminados, ["numeric_id"]].astype(int).to_dict("records"),
+    )
+
+    return {
+        "inserted": int(nuevos.sum()),
+        "updated": int(modificados.sum()),
+        "deleted": int(eliminados.sum()),
+        "unchanged": int((en_ambos & ~modificados).sum()),
+    }
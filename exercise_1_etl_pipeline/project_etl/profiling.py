@@ -0,0 +1,99 @@
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+
+def current_rss_mb():
+    """Memoria residente actual del proceso en MB, leída de /proc/self/statm (segundo campo, en páginas); None fuera de Linux."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def reset_peak_rss():
+    """
+    Reinicia el pico de RSS del proceso (VmHWM) al RSS actual escribiendo "5" en /proc/self/clear_refs
+    (Linux >= 4.0). Devuelve False si no está disponible: el pico pasa a ser el de toda la vida del proceso.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss_mb():
+    """
+    Pico de memoria residente en MB: VmHWM de /proc/self/status (desde el último reset_peak_rss) o,
+    donde no existe, ru_maxrss (pico de toda la vida del proceso; KB en Linux y bytes en macOS).
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StageTimer:
+    """
+    Mide el tiempo de pared, el pico de RSS, la variación de RSS y las filas por segundo de cada etapa de un asset.
+
+        timer = StageTimer()
+        with timer.stage("extract") as stage:
+            df = ...
+            stage["rows"] = len(df)
+        Output(..., metadata=timer.metadata())
+    """
+
+    def __init__(self):
+        self.stages = {}
+        # Etapas abiertas: una etapa anidada reinicia VmHWM, así que su pico se propaga a las que la contienen
+        self._open = []
+
+    @contextmanager
+    def stage(self, name):
+        info = {"rows": None, "peak_rss_mb": 0.0}
+        if self._open:
+            # El pico que alcanzaron las etapas abiertas hasta ahora se conserva antes de reiniciarlo
+            peak = peak_rss_mb()
+            for parent in self._open:
+                parent["peak_rss_mb"] = max(parent["peak_rss_mb"], peak)
+        reset_peak_rss()
+        rss_start = current_rss_mb()
+        self._open.append(info)
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            seconds = time.perf_counter() - start
+            self._open.pop()
+            info["seconds"] = seconds
+            info["peak_rss_mb"] = max(info["peak_rss_mb"], peak_rss_mb())
+            for parent in self._open:
+                parent["peak_rss_mb"] = max(parent["peak_rss_mb"], info["peak_rss_mb"])
+            rss_end = current_rss_mb()
+            info["rss_delta_mb"] = rss_end - rss_start if rss_end is not None and rss_start is not None else None
+            self.stages[name] = info
+
+    def metadata(self):
+        """Metadata plana (stage_<nombre>_<métrica>) para que Dagster grafique cada valor entre runs."""
+        metadata = {}
+        for name, info in self.stages.items():
+            metadata[f"stage_{name}_seconds"] = round(info["seconds"], 4)
+            metadata[f"stage_{name}_peak_rss_mb"] = round(info["peak_rss_mb"], 1)
+            if info["rss_delta_mb"] is not None:
+                metadata[f"stage_{name}_rss_delta_mb"] = round(info["rss_delta_mb"], 1)
+            if info["rows"] is not None:
+                rows_per_sec = info["rows"] / info["seconds"] if info["seconds"] > 0 else 0.0
+                metadata[f"stage_{name}_rows_per_sec"] = round(rows_per_sec, 1)
+        return metadata
@@ -0,0 +1,282 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+from scipy import sparse
+
+
+def _a_numero(valor):
+    """
+    Equivalente a pd.to_numeric(errors='coerce') para una sola celda.
+    Devuelve None si la celda no es numérica.
+    """
+    if valor is None:
+        return None
+    if isinstance(valor, (int, float)):
+        return None if valor != valor else valor  # NaN -> None
+    try:
+        return float(str(valor).strip())
+    except ValueError:
+        return None
+
+
+def normalizar_relaciones(person_a, person_b):
+    """
+    Normaliza una lista de relaciones (person_a, person_b) por ID:
+    descarta autorrelaciones, ordena cada par y conserva la primera aparición de cada relación.
+    """
+    person_a = np.asarray(person_a, dtype=np.int32)
+    person_b = np.asarray(person_b, dtype=np.int32)
+    distintos = person_a != person_b
+
+    # Plegamos el triángulo inferior sobre el superior: (a, b) y (b, a) son la misma relación.
+    menores = np.minimum(person_a, person_b)[distintos]
+    mayores = np.maximum(person_a, person_b)[distintos]
+
+    # Clave int64 por par para deduplicar sin construir tuplas de Python.
+    claves = (menores.astype(np.int64) << 32) | (mayores.astype(np.int64) & 0xFFFFFFFF)
+    _, primeros = np.unique(claves, return_index=True)
+    primeros.sort()
+
+    return pd.DataFrame({
+        "person_a": menores[primeros],
+        "person_b": mayores[primeros],
+    })
+
+
+def pares_a_relaciones(ids, pares):
+    """
+    Convierte pares de posiciones (fila, columna) de la matriz en la lista final de relaciones.
+    Replica el resultado del flujo original (stack + np.sort + drop_duplicates).
+    """
+    ids = np.asarray(ids, dtype=np.int32)
+    pares = np.asarray(pares, dtype=np.int32).reshape(-1, 2)
+    return normalizar_relaciones(ids[pares[:, 0]], ids[pares[:, 1]])
+
+
+def _escanear_filas(sheet, fila_inicio, fila_fin, columnas_encabezado):
+    """
+    Recorre las filas [fila_inicio, fila_fin] de la hoja y devuelve (ids, pares) como buffers int32.
+    Las posiciones de fila son relativas al bloque (0 = primera fila con ID válido del bloque).
+    """
+    ids = array("i")
+    pares = array("i")  # Posiciones (fila, columna) intercaladas
+
+    filas = sheet.iter_rows(min_row=fila_inicio, max_row=fila_fin, values_only=True)
+    for fila in filas:
+        if not fila:
+            continue
+        id_fila = _a_numero(fila[0])
+        if id_fila is None:
+            # Filas sin ID válido (vacías o de notas) no forman parte de la matriz.
+            continue
+
+        posicion_fila = len(ids)
+        ids.append(int(id_fila))
+        for posicion_columna, valor in enumerate(fila[columnas_encabezado:]):
+            if valor is not None and _a_numero(valor) == 1:
+                pares.append(posicion_fila)
+                pares.append(posicion_columna)
+    return ids, pares
+
+
+def _a_posiciones(ids, pares):
+    """Convierte los buffers a arrays y descarta las columnas sin un ID correspondiente en la columna A."""
+    ids = np.frombuffer(ids, dtype=np.int32)
+    posiciones = np.frombuffer(pares, dtype=np.int32).reshape(-1, 2)
+    return ids, posiciones[posiciones[:, 1] < len(ids)]
+
+
+def escanear_matriz_excel(excel_path, sheet_name, filas_encabezado=2, columnas_encabezado=2):
+    """
+    Lee la matriz de adyacencia fila por fila (openpyxl en modo read-only) y devuelve
+    (ids, posiciones): el ID de cada fila y las posiciones (fila, columna) de las celdas con valor 1.
+
+    A diferencia de pd.read_excel + DataFrame(N x N), nunca materializa la matriz:
+    solo guarda las posiciones de las celdas con valor 1 en un buffer int32,
+    por lo que la memoria crece con el número de relaciones y no con N².
+
+    La columna A contiene el ID de cada fila y, al igual que en el flujo original,
+    la columna j del bloque de datos corresponde al j-ésimo ID de esa columna.
+    """
+    workbook = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name]
+        ids, pares = _escanear_filas(sheet, filas_encabezado + 1, None, columnas_encabezado)
+    finally:
+        workbook.close()
+
+    return _a_posiciones(ids, pares)
+
+
+def _escanear_bloque(excel_path, sheet_name, fila_inicio, fila_fin, columnas_encabezado):
+    # Cada proceso abre su propio workbook: los objetos de openpyxl no se pueden compartir entre procesos.
+    workbook = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        ids, pares = _escanear_filas(workbook[sheet_name], fila_inicio, fila_fin, columnas_encabezado)
+    finally:
+        workbook.close()
+    return ids.tobytes(), pares.tobytes()
+
+
+def escanear_matriz_excel_paralelo(excel_path, sheet_name, workers, filas_por_bloque=None,
+                                   filas_encabezado=2, columnas_encabezado=2):
+    """
+    Igual que escanear_matriz_excel, pero reparte la hoja en bloques de filas que se leen en un
+    pool de procesos. Los bloques se unen en orden, desplazando las posiciones de fila de cada uno,
+    por lo que el resultado es idéntico al de la lectura en serie.
+    """
+    workbook = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        ultima_fila = workbook[sheet_name].max_row
+    finally:
+        workbook.close()
+
+    primera_fila = filas_encabezado + 1
+    if workers <= 1 or not ultima_fila or ultima_fila < primera_fila:
+        return escanear_matriz_excel(excel_path, sheet_name, filas_encabezado, columnas_encabezado)
+
+    total_filas = ultima_fila - primera_fila + 1
+    filas_por_bloque = filas_por_bloque or -(-total_filas // workers)
+    bloques = [
+        (inicio, min(inicio + filas_por_bloque - 1, ultima_fila))
+        for inicio in range(primera_fila, ultima_fila + 1, filas_por_bloque)
+    ]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futuros = [
+            executor.submit(_escanear_bloque, excel_path, sheet_name, inicio, fin, columnas_encabezado)
+            for inicio, fin in bloques
+        ]
+        resultados = [futuro.result() for futuro in futuros]
+
+    ids_bloques, posiciones_bloques = [], []
+    desplazamiento = 0
+    for ids_bytes, pares_bytes in resultados:
+        ids_bloque = np.frombuffer(ids_bytes, dtype=np.int32)
+        posiciones = np.frombuffer(pares_bytes, dtype=np.int32).reshape(-1, 2).copy()
+        posiciones[:, 0] += desplazamiento
+        desplazamiento += len(ids_bloque)
+        ids_bloques.append(ids_bloque)
+        posiciones_bloques.append(posiciones)
+
+    ids = np.concatenate(ids_bloques) if ids_bloques else np.empty(0, dtype=np.int32)
+    posiciones = np.concatenate(posiciones_bloques) if posiciones_bloques else np.empty((0, 2), dtype=np.int32)
+    return ids, posiciones[posiciones[:, 1] < len(ids)]
+
+
+def relaciones_triangulo_superior(ids, posiciones):
+    """
+    Variante de pares_a_relaciones sin deduplicación global: cada celda (i, j) con i < j es una relación
+    única por construcción. Las celdas del triángulo inferior solo se conservan si su espejo no está
+    en el triángulo superior (matrices no simétricas); en una matriz simétrica se descartan todas.
+    El orden de salida coincide con el de pares_a_relaciones (primera aparición en orden fila-columna).
+    Si hay IDs repetidos en la columna A se recurre a pares_a_relaciones.
+    """
+    ids = np.asarray(ids, dtype=np.int32)
+    if len(np.unique(ids)) != len(ids):
+        return pares_a_relaciones(ids, posiciones)
+
+    posiciones = np.asarray(posiciones, dtype=np.int64).reshape(-1, 2)
+    filas, columnas = posiciones[:, 0], posiciones[:, 1]
+    n = len(ids)
+
+    superior = filas < columnas
+    inferior = filas > columnas
+    claves_superior = filas[superior] * n + columnas[superior]
+    espejos_inferior = columnas[inferior] * n + filas[inferior]
+
+    conservar = superior.copy()
+    conservar[inferior] = ~np.isin(espejos_inferior, claves_superior)
+
+    person_a = ids[filas[conservar]]
+    person_b = ids[columnas[conservar]]
+    return pd.DataFrame({
+        "person_a": np.minimum(person_a, person_b),
+        "person_b": np.maximum(person_a, person_b),
+    })
+
+
+def leer_relaciones_excel(excel_path, sheet_name, filas_encabezado=2, columnas_encabezado=2):
+    """Lee la matriz de adyacencia y devuelve un DataFrame con las columnas person_a y person_b."""
+    ids, posiciones = escanear_matriz_excel(excel_path, sheet_name, filas_encabezado, columnas_encabezado)
+    return pares_a_relaciones(ids, posiciones)
+
+
+def leer_actores_excel(excel_path, sheet_name):
+    """
+    Lee la lista de actores (columnas A:C a partir de la fila 5) y la devuelve limpia,
+    con las columnas letter_code, numeric_id y actor_name.
+    """
+    # Leemos los datos, saltando las primeras 4 filas y usando solo las columnas A, B, C
+    df = pd.read_excel(
+        excel_path,
+        sheet_name=sheet_name,
+        header=None,
+        skiprows=4,
+        usecols="A:C"
+    )
+    # Nombramos las columnas
+    df.columns = ["letter_code", "numeric_id", "actor_name"]
+
+    # Limpieza de datos
+    df.dropna(how="all", inplace=True) # Eliminar filas completamente vacías
+    df['numeric_id'] = df['numeric_id'].astype(int) # Asegurar que el ID es un número entero
+
+    # Convierte todos los códigos a mayúsculas para asegurar consistencia
+    df['letter_code'] = df['letter_code'].str.upper()
+
+    return df.reset_index(drop=True)
+
+
+# --- Fuentes alternativas de relaciones (sin el límite de 16,384 columnas de Excel) ---
+
+RELATIONSHIP_COLUMNS = ["person_a", "person_b"]
+
+
+def _normalizar_lotes(lotes):
+    """Convierte cada lote (person_a, person_b) a int32, descartando IDs no numéricos, y normaliza el total."""
+    person_a, person_b = [np.empty(0, dtype=np.int32)], [np.empty(0, dtype=np.int32)]
+    for lote_a, lote_b in lotes:
+        lote = pd.DataFrame({"a": lote_a, "b": lote_b}).apply(pd.to_numeric, errors="coerce").dropna()
+        person_a.append(lote["a"].to_numpy(dtype=np.int32))
+        person_b.append(lote["b"].to_numpy(dtype=np.int32))
+    return normalizar_relaciones(np.concatenate(person_a), np.concatenate(person_b))
+
+
+def leer_relaciones_csv(path, chunksize=1_000_000):
+    """Lista de relaciones en CSV con columnas person_a y person_b, leída por bloques."""
+    lotes = pd.read_csv(path, usecols=RELATIONSHIP_COLUMNS, chunksize=chunksize)
+    return _normalizar_lotes((lote["person_a"], lote["person_b"]) for lote in lotes)
+
+
+def leer_relaciones_parquet(path, batch_size=1_000_000):
+    """Lista de relaciones en Parquet con columnas person_a y person_b, leída por record batches."""
+    lotes = pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=RELATIONSHIP_COLUMNS)
+    return _normalizar_lotes((lote.column(0).to_numpy(zero_copy_only=False),
+                              lote.column(1).to_numpy(zero_copy_only=False)) for lote in lotes)
+
+
+def leer_relaciones_npz(path, batch_size=1_000_000):
+    """
+    Matriz de adyacencia dispersa de SciPy (scipy.sparse.save_npz). Los índices de fila y columna
+    son directamente los numeric_id de los actores; cualquier valor distinto de cero es una relación.
+    """
+    matriz = sparse.load_npz(path).tocoo()
+    no_nulos = matriz.data != 0
+    filas, columnas = matriz.row[no_nulos], matriz.col[no_nulos]
+    lotes = (
+        (filas[inicio:inicio + batch_size], columnas[inicio:inicio + batch_size])
+        for inicio in range(0, len(filas), batch_size)
+    )
+    return _normalizar_lotes(lotes)
+
+
+RELATIONSHIP_READERS = {
+    "edge_csv": leer_relaciones_csv,
+    "edge_parquet": leer_relaciones_parquet,
+    "npz": leer_relaciones_npz,
+}
@@ -1,17 +1,205 @@
 import os
-from dagster import resource
-from sqlalchemy import create_engine
+import tempfile
+import threading
+import time
+from dagster import resource, Field, Noneable
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
 
-@resource
-def mysql_connection_resource(_):
+
+class DBMetrics:
+    """Contadores de uso de la base de datos: checkouts del pool, consultas y tiempo total."""
+
+    FIELDS = ("db_checkouts", "db_checkout_seconds", "db_queries", "db_seconds")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = dict.fromkeys(self.FIELDS, 0)
+
+    def add(self, **increments):
+        with self._lock:
+            for key, value in increments.items():
+                self._values[key] += value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def metadata_since(self, start):
+        """Diferencia contra un snapshot previo, lista para usarse como metadata de un asset."""
+        current = self.snapshot()
+        delta = {key: current[key] - start[key] for key in self.FIELDS}
+        delta["db_checkout_seconds"] = round(delta["db_checkout_seconds"], 4)
+        delta["db_seconds"] = round(delta["db_seconds"], 4)
+        return delta
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool que mide cuánto se espera para obtener una conexión del pool."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = DBMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            self.metrics.add(db_checkouts=1, db_checkout_seconds=time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() recrea el pool; los contadores se conservan.
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def _instrumentar_consultas(engine, metrics):
+    # El inicio va en el contexto de la ejecución y no en conn.info: si la sentencia falla no hay
+    # after_cursor_execute, y la conexión vuelve al pool sin valores pendientes.
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._etl_query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        metrics.add(db_queries=1, db_seconds=time.perf_counter() - context._etl_query_start)
+
+
+def metricas_db(engine):
+    """Devuelve el DBMetrics asociado a un engine creado por mysql_connection_resource."""
+    return engine.pool.metrics
+
+
+@resource(
+    config_schema={
+        "pool_size": Field(int, default_value=5, description="Conexiones persistentes en el pool."),
+        "max_overflow": Field(int, default_value=10, description="Conexiones extra permitidas sobre pool_size."),
+        "pool_recycle": Field(
+            int, default_value=3600, description="Segundos tras los cuales una conexión se recicla (evita conexiones caducadas)."
+        ),
+        "pool_pre_ping": Field(bool, default_value=True, description="Verifica la conexión antes de usarla."),
+        "pool_timeout": Field(int, default_value=30, description="Segundos máximos de espera por una conexión libre."),
+    }
+)
+def mysql_connection_resource(init_context):
     host = os.getenv("MYSQL_HOST")
     user = os.getenv("MYSQL_USER")
     password = os.getenv("MYSQL_PASSWORD")
     db = os.getenv("MYSQL_DATABASE")
     port = os.getenv("MYSQL_PORT")
+    config = init_context.resource_config
 
     conn_url = f"mysql+pymysql://{user}:{password}@{host}:{port}/{db}"
-    engine = create_engine(conn_url)
-    yield engine
+    metrics = DBMetrics()
+    engine = create_engine(
+        conn_url,
+        # local_infile habilita (del lado del cliente) la estrategia LOAD DATA LOCAL INFILE del bulk loader.
+        connect_args={"local_infile": True},
+        poolclass=TimedQueuePool,
+        pool_size=config["pool_size"],
+        max_overflow=config["max_overflow"],
+        pool_recycle=config["pool_recycle"],
+        pool_pre_ping=config["pool_pre_ping"],
+        pool_timeout=config["pool_timeout"],
+    )
+    engine.pool.metrics = metrics
+    _instrumentar_consultas(engine, metrics)
+    try:
+        yield engine
+    finally:
+        # Cierra las conexiones del pool al terminar el paso.
+        engine.dispose()
+
+mysql_etl_resource = mysql_connection_resource
+
+
+class MySQLBulkLoader:
+    """
+    Carga DataFrames en MySQL con distintas estrategias y mide el rendimiento de cada una:
+
+    - to_sql: DataFrame.to_sql con la estrategia por defecto de pandas.
+    - executemany: INSERT multi-fila en lotes de chunk_size (PyMySQL agrupa cada lote en un solo INSERT).
+    - load_data: escribe un CSV temporal y lo carga con LOAD DATA LOCAL INFILE.
+    """
+
+    STRATEGIES = ("to_sql", "executemany", "load_data")
+
+    def __init__(self, chunk_size=10_000, tmp_dir=None):
+        self.chunk_size = chunk_size
+        self.tmp_dir = tmp_dir
+
+    def load(self, conn, table_name, df, strategy="to_sql"):
+        """Inserta df en table_name usando la conexión (y transacción) del asset. Devuelve estadísticas."""
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Estrategia de carga desconocida: '{strategy}'. Opciones: {self.STRATEGIES}")
+
+        start = time.perf_counter()
+        if not df.empty:
+            getattr(self, f"_load_{strategy}")(conn, table_name, df)
+        seconds = time.perf_counter() - start
+
+        return {
+            "load_strategy": strategy,
+            "load_rows": len(df),
+            "load_seconds": round(seconds, 4),
+            "rows_per_sec": round(len(df) / seconds, 1) if seconds > 0 else 0.0,
+        }
+
+    def _load_to_sql(self, conn, table_name, df):
+        df.to_sql(table_name, con=conn, if_exists="append", index=False)
+
+    def _load_executemany(self, conn, table_name, df):
+        columns = ", ".join(df.columns)
+        placeholders = ", ".join(["%s"] * len(df.columns))
+        query = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+
+        # itertuples con tipos nativos de Python (PyMySQL no sabe escapar tipos de numpy).
+        rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.chunk_size:
+                conn.exec_driver_sql(query, batch)
+                batch = []
+        if batch:
+            conn.exec_driver_sql(query, batch)
+
+    def _load_load_data(self, conn, table_name, df):
+        # Con tmp_dir="/dev/shm" el archivo intermedio vive en memoria y no toca disco.
+        with tempfile.NamedTemporaryFile(
+            "w", suffix=".csv", dir=self.tmp_dir, delete=False, encoding="utf-8", newline=""
+        ) as tmp:
+            df.to_csv(tmp, index=False, header=False, lineterminator="\n", na_rep="NULL")
+            path = tmp.name
+        try:
+            conn.exec_driver_sql(
+                f"""
+                LOAD DATA LOCAL INFILE '{path.replace(os.sep, "/")}'
+                INTO TABLE {table_name}
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"' ESCAPED BY ''
+                LINES TERMINATED BY '\\n'
+                ({", ".join(df.columns)})
+                """
+            )
+        finally:
+            os.remove(path)
+
 
-mysql_etl_resource = mysql_connection_resource
\ No newline at end of file
+@resource(
+    config_schema={
+        "chunk_size": Field(int, default_value=10_000, description="Filas por lote en la estrategia executemany."),
+        "tmp_dir": Field(
+            Noneable(str),
+            default_value=None,
+            description="Directorio del CSV temporal de LOAD DATA (p. ej. /dev/shm para mantenerlo en memoria).",
+        ),
+    },
+)
+def mysql_bulk_loader_resource(init_context):
+    yield MySQLBulkLoader(
+        chunk_size=init_context.resource_config["chunk_size"],
+        tmp_dir=init_context.resource_config["tmp_dir"],
+    )
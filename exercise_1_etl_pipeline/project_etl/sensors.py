@@ -0,0 +1,69 @@
+import json
+import os
+import time
+
+from dagster import sensor, RunRequest, SkipReason, AssetKey, AssetSelection
+
+from .assets import MATRIX_SHEET_NAME, ACTORS_SHEET_NAME
+from .cache import DEFAULT_EXCEL_PATH, fingerprint_hojas
+from .schedules import all_assets_job
+
+# Segundos que el archivo debe permanecer sin cambios antes de lanzar un run:
+# varias escrituras seguidas (copias, guardados parciales) producen un solo run.
+DEBOUNCE_SECONDS = 60
+
+# Assets que consumen cada hoja; el sensor agrega también sus assets downstream.
+SHEET_ASSETS = {
+    MATRIX_SHEET_NAME: ["user_relationships_table", "actor_graph_metrics"],
+    ACTORS_SHEET_NAME: ["actors_table", "actor_graph_metrics"],
+}
+# El caché convierte ambas hojas, así que se materializa ante cualquier cambio
+# (sin sus downstream, que incluirían los assets de la hoja que no cambió).
+CACHE_ASSET = "relationships_workbook_cache"
+
+
+@sensor(
+    job=all_assets_job,
+    minimum_interval_seconds=30,
+    description="Detecta cambios en el Excel de relaciones (RELATIONSHIPS_EXCEL_PATH) y materializa solo los assets de las hojas modificadas.",
+)
+def relationships_file_sensor(context):
+    excel_path = DEFAULT_EXCEL_PATH
+    if not os.path.exists(excel_path):
+        return SkipReason(f"No existe el archivo '{excel_path}'.")
+
+    state = json.loads(context.cursor) if context.cursor else {}
+    mtime = os.path.getmtime(excel_path)
+
+    # Comparar la fecha de modificación es barato; solo se hashean las hojas si el archivo cambió.
+    if mtime == state.get("mtime"):
+        return SkipReason("El archivo no cambió desde la última revisión.")
+    if time.time() - mtime < DEBOUNCE_SECONDS:
+        return SkipReason(f"El archivo se modificó hace menos de {DEBOUNCE_SECONDS}s; esperando a que se estabilice.")
+
+    sheet_hashes = fingerprint_hojas(excel_path, list(SHEET_ASSETS))
+    previous_hashes = state.get("sheets")
+    context.update_cursor(json.dumps({"mtime": mtime, "sheets": sheet_hashes}))
+
+    if previous_hashes is None:
+        # Primera evaluación: se toma el estado actual como referencia (la carga inicial la hace el schedule).
+        return SkipReason("Se registraron los hashes iniciales de las hojas.")
+
+    changed_sheets = [name for name, digest in sheet_hashes.items() if previous_hashes.get(name) != digest]
+    if not changed_sheets:
+        return SkipReason("El archivo se guardó, pero el contenido de las hojas no cambió.")
+
+    asset_keys = sorted({key for name in changed_sheets for key in SHEET_ASSETS[name]})
+    selection = (
+        AssetSelection.keys(*asset_keys).downstream() | AssetSelection.keys(CACHE_ASSET)
+    ).resolve(context.repository_def.asset_graph)
+    context.log.info(f"Hojas modificadas: {changed_sheets}. Assets a materializar: {sorted(k.to_user_string() for k in selection)}")
+
+    return RunRequest(
+        # Incluye mtime: volver a una versión anterior del archivo también debe lanzar un run.
+        run_key="-".join([*(sheet_hashes[name][:12] for name in sorted(sheet_hashes)), str(int(mtime))]),
+        asset_selection=sorted(selection, key=AssetKey.to_user_string),
+        # El run lee el mismo archivo que el sensor revisó, aunque la configuración por defecto del asset cambie.
+        run_config={"ops": {CACHE_ASSET: {"config": {"excel_path": excel_path}}}},
+        tags={"changed_sheets": ",".join(changed_sheets)},
+    )
@@ -0,0 +1,302 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from . import models
+
+# Departamentos creados en la transacción actual: solo se publican en el caché si la transacción hace commit
+PENDING_KEY = "pending_departments"
+
+
+class DepartmentCache:
+    """
+    Caché en proceso nombre -> id de departamento, compartido (y protegido con un lock) entre requests.
+    Solo contiene ids de filas confirmadas: los departamentos creados en una transacción quedan en
+    session.info hasta el commit y se descartan si hay rollback.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}
+        self.hits = 0
+        self.misses = 0
+
+    def warm(self, db: Session):
+        """Carga todos los departamentos existentes (se llama al arrancar la API)."""
+        rows = db.query(models.Department.name, models.Department.id).all()
+        with self._lock:
+            self._ids.update(rows)
+        return len(rows)
+
+    def invalidate(self, name=None):
+        """Olvida un departamento (o todos); la siguiente búsqueda vuelve a consultar la base de datos."""
+        with self._lock:
+            if name is None:
+                self._ids.clear()
+            else:
+                self._ids.pop(name, None)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._ids), "hits": self.hits, "misses": self.misses}
+
+    def lookup(self, db: Session, names):
+        """Devuelve ({nombre: id} de los nombres en caché, [nombres que faltan]) y actualiza los contadores."""
+        pending = db.info.get(PENDING_KEY, {})
+        found, missing = {}, []
+        with self._lock:
+            for name in names:
+                department_id = self._ids.get(name, pending.get(name))
+                if department_id is None:
+                    missing.append(name)
+                else:
+                    found[name] = department_id
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def remember(self, db: Session, ids, committed):
+        """Guarda ids ya confirmados en el caché, o como pendientes de la transacción de `db`."""
+        if committed:
+            with self._lock:
+                self._ids.update(ids)
+        else:
+            db.info.setdefault(PENDING_KEY, {}).update(ids)
+
+    def get_id(self, db: Session, name):
+        """Id del departamento `name`, creándolo si no existe."""
+        found, _ = self.lookup(db, [name])
+        if name in found:
+            return found[name]
+
+        department_id = self._select_id(db, name)
+        if department_id is not None:
+            self.remember(db, {name: department_id}, committed=True)
+            return department_id
+        return self._create(db, name)
+
+    def _create(self, db: Session, name):
+        try:
+            # SAVEPOINT: si otro request crea el mismo nombre al mismo tiempo, solo se deshace este INSERT
+            with db.begin_nested():
+                department = models.Department(name=name)
+                db.add(department)
+        except IntegrityError:
+            # Violación del UNIQUE en name: la fila ya existe (confirmada por el otro request), se relee
+            department_id = self._select_id(db, name)
+            self.remember(db, {name: department_id}, committed=True)
+            return department_id
+
+        self.remember(db, {name: department.id}, committed=False)
+        return department.id
+
+    def get(self, db: Session, name):
+        """Instancia de Department asociada a la sesión, sin hacer un SELECT si el id está en caché."""
+        department_id = self.get_id(db, name)
+        department = db.identity_map.get(db.identity_key(models.Department, department_id))
+        if department is None:
+            # Se adjunta como fila ya persistida (detached -> persistent) sin consultarla
+            department = models.Department(id=department_id, name=name)
+            make_transient_to_detached(department)
+            db.add(department)
+        return department
+
+    @staticmethod
+    def _select_id(db: Session, name):
+        return db.query(models.Department.id).filter(models.Department.name == name).scalar()
+
+    def _publish(self, session):
+        pending = session.info.pop(PENDING_KEY, None)
+        if pending:
+            with self._lock:
+                self._ids.update(pending)
+
+    def _discard(self, session):
+        session.info.pop(PENDING_KEY, None)
+
+
+department_cache = DepartmentCache()
+
+event.listen(Session, "after_commit", department_cache._publish)
+event.listen(Session, "after_rollback", department_cache._discard)
+
+
+# === Caché de lectura de contactos (GET /contacts/{id}) ===
+
+def _entry_version(value):
+    """Versión del contacto: cada entrada es "<version>", "<etag>" y el cuerpo, separados por saltos de línea."""
+    return int(value.split(b"\n", 1)[0])
+
+class LRUTTLBackend:
+    """Backend en proceso: LRU con un máximo de entradas y expiración por TTL."""
+
+    def __init__(self, max_entries=10_000, ttl_seconds=300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def set_if_newer(self, key, version, value):
+        """Guarda `value` salvo que la entrada vigente sea de una versión posterior (comparación y escritura atómicas)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic() and _entry_version(entry[1]) > version:
+                return False
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisBackend:
+    """Backend compartido entre procesos sobre cualquier cliente con protocolo Redis (redis-py, fakeredis)."""
+
+    def __init__(self, client, ttl_seconds=300, prefix="contacts:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value, ex=self.ttl_seconds)
+
+    def set_if_newer(self, key, version, value):
+        """Igual que LRUTTLBackend.set_if_newer, con WATCH/MULTI: si otro proceso escribe la clave, se reintenta."""
+        from redis.exceptions import WatchError
+
+        key = self.prefix + key
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    current = pipe.get(key)
+                    if current is not None and _entry_version(current) > version:
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.set(key, value, ex=self.ttl_seconds)
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + "*"):
+            self.client.delete(key)
+
+
+class ContactCache:
+    """
+    Caché read-through del JSON de cada contacto. Guarda el cuerpo ya serializado junto con su ETag
+    (hash del contenido), así que una respuesta 304 o 200 desde el caché no toca la base de datos.
+    Las escrituras de crud invalidan la entrada del contacto; el TTL acota lo que quede desactualizado
+    por escrituras fuera de la API (por ejemplo, la ingesta).
+
+    Cada entrada lleva la versión del contacto. Al invalidar tras un cambio se deja una marca con la
+    versión nueva (sin cuerpo), y set solo guarda un cuerpo si no hay una versión posterior: un GET que
+    leyó la fila antes de un PUT/PATCH y escribe en el caché después de la invalidación no deja la
+    versión anterior en caché.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def etag_for(body):
+        return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+    def get(self, contact_id):
+        """Devuelve (etag, cuerpo) o None."""
+        value = self.backend.get(str(contact_id)) if self.backend else None
+        entry = value.split(b"\n", 2)[1:] if value is not None else None
+        with self._lock:
+            if not entry or not entry[0]:  # sin entrada, o solo la marca de una invalidación
+                self.misses += 1
+                return None
+            self.hits += 1
+        etag, body = entry
+        return etag.decode(), body
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+    def set(self, contact_id, body, version):
+        """Guarda el cuerpo de la versión `version` (si no hay una posterior en caché) y devuelve su ETag."""
+        etag = self.etag_for(body)
+        if self.backend:
+            self.backend.set_if_newer(str(contact_id), version, f"{version}\n{etag}\n".encode() + body)
+        return etag
+
+    def invalidate(self, contact_id, version=None):
+        """Descarta la entrada; con `version` (la recién confirmada) impide volver a cachear versiones anteriores."""
+        if not self.backend:
+            return
+        if version is None:
+            self.backend.delete(str(contact_id))
+        else:
+            self.backend.set_if_newer(str(contact_id), version, f"{version}\n\n".encode())
+
+    def clear(self):
+        if self.backend:
+            self.backend.clear()
+
+
+def build_contact_cache_backend(kind=None):
+    """Backend según CONTACT_CACHE_BACKEND: "memory" (por defecto), "redis" (REDIS_URL) o "none"."""
+    kind = kind or os.getenv("CONTACT_CACHE_BACKEND", "memory")
+    ttl_seconds = int(os.getenv("CONTACT_CACHE_TTL", "300"))
+    if kind == "none":
+        return None
+    if kind == "redis":
+        import redis  # Dependencia opcional: solo se necesita con este backend
+
+        return RedisBackend(redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0")), ttl_seconds)
+    if kind == "memory":
+        return LRUTTLBackend(int(os.getenv("CONTACT_CACHE_MAX_ENTRIES", "10000")), ttl_seconds)
+    raise ValueError(f"CONTACT_CACHE_BACKEND desconocido: {kind}")
+
+
+contact_cache = ContactCache(build_contact_cache_backend())
@@ -1,57 +1,359 @@
+import base64
+import binascii
+import json
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import case, func, literal, literal_column, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session, joinedload
-from . import models, schemas
+from sqlalchemy.orm.exc import StaleDataError
+from . import models, schemas, stats
+from .cache import contact_cache, department_cache
+
+# === Paginación por cursor ===
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(last_id: int) -> str:
+    # El cursor es opaco para el cliente: solo debe reenviarlo tal cual en la siguiente petición
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))["id"]
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+    if not isinstance(last_id, int):
+        raise InvalidCursor(cursor)
+    return last_id
 
 # === Funciones de Lectura (GET) ===
 def get_contact(db: Session, contact_id: int):
     return db.query(models.Contact).options(joinedload(models.Contact.departments)).filter(models.Contact.id == contact_id).first()
 
-def get_contacts(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Contact).options(joinedload(models.Contact.departments)).offset(skip).limit(limit).all()
+def get_contact_by_email(db: Session, email: str):
+    return db.query(models.Contact).filter(models.Contact.email == email).first()
+
+def _filter_contacts(query, skip: int, limit: int, after_id: Optional[int],
+                     state: Optional[str], city: Optional[str], department: Optional[str]):
+    query = query.order_by(models.Contact.id)
+    if state:
+        query = query.filter(models.Contact.state == state.upper())
+    if city:
+        query = query.filter(models.Contact.city == city)
+    if department:
+        # EXISTS sobre la tabla de unión en lugar de un JOIN, para no duplicar contactos
+        query = query.filter(models.Contact.departments.any(models.Department.name == department))
+    if after_id is not None:
+        # Keyset: el índice sobre id salta directo al inicio de la página, sin recorrer las anteriores
+        query = query.filter(models.Contact.id > after_id)
+    else:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+# Columnas en el mismo orden que los campos de schemas.Contact, para que el JSON sea idéntico
+CONTACT_FIELDS = [*schemas.ContactBase.model_fields, "id", "version"]
+
+def _contact_rows(db: Session, query):
+    """Ejecuta una consulta de columnas CONTACT_FIELDS y agrega los departamentos de todos los contactos en una consulta IN."""
+    contacts = [dict(zip(CONTACT_FIELDS, row)) for row in query]
+    if not contacts:
+        return contacts
+
+    by_id = {}
+    for contact in contacts:
+        contact["departments"] = []
+        by_id[contact["id"]] = contact
+
+    association = models.contact_department_association
+    departments = (
+        db.query(association.c.contact_id, models.Department.id, models.Department.name)
+        .join(models.Department, models.Department.id == association.c.department_id)
+        .filter(association.c.contact_id.in_(list(by_id)))
+        .order_by(association.c.contact_id, models.Department.id)
+    )
+    for contact_id, department_id, name in departments:
+        by_id[contact_id]["departments"].append({"id": department_id, "name": name})
+    return contacts
+
+def get_contacts_rows(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None,
+                      state: Optional[str] = None, city: Optional[str] = None, department: Optional[str] = None):
+    """
+    Página de contactos (GET /contacts/) como dicts planos con la forma de schemas.Contact:
+    proyecta solo las columnas necesarias (sin instanciar objetos ORM) y trae los departamentos
+    de toda la página en una sola consulta IN, como selectinload.
+    """
+    columns = [getattr(models.Contact, field) for field in CONTACT_FIELDS]
+    query = _filter_contacts(db.query(*columns), skip, limit, after_id, state, city, department)
+    return _contact_rows(db, query)
+
+# === Exportación (GET /contacts/export) ===
+def export_contacts_statement(dialect_name: str, since_id: Optional[int] = None):
+    """
+    SELECT de todos los contactos (id > since_id) en orden de id, con sus departamentos ya agregados
+    como arreglo JSON en una subconsulta correlacionada (usa la PK de la tabla de unión, sin N+1).
+    """
+    association = models.contact_department_association
+    if dialect_name == "postgresql":
+        aggregate = func.json_agg(func.json_build_object("id", models.Department.id, "name", models.Department.name))
+    else:
+        aggregate = func.json_group_array(func.json_object("id", models.Department.id, "name", models.Department.name))
+    departments = (
+        select(aggregate)
+        .select_from(association.join(models.Department, models.Department.id == association.c.department_id))
+        .where(association.c.contact_id == models.Contact.id)
+        .scalar_subquery()
+    )
+
+    statement = select(*(getattr(models.Contact, field) for field in CONTACT_FIELDS), departments).order_by(models.Contact.id)
+    if since_id is not None:
+        statement = statement.where(models.Contact.id > since_id)
+    return statement
+
+def export_row(row):
+    """Fila del SELECT de exportación -> dict con la forma de schemas.Contact."""
+    contact = dict(zip(CONTACT_FIELDS, row))
+    departments = row[-1]
+    # json_agg sin filas es NULL; psycopg2 entrega el JSON ya parseado, asyncpg y SQLite como texto
+    if isinstance(departments, (str, bytes)):
+        departments = json.loads(departments)
+    contact["departments"] = departments or []
+    return contact
+
+# === Búsqueda (GET /contacts/search) ===
+def search_contacts(db: Session, q: str, limit: int = 20):
+    """
+    Busca contactos por nombre, apellido, empresa, email o ciudad, ordenados por relevancia.
+    En PostgreSQL usa similitud de trigramas (pg_trgm) sobre models.CONTACT_SEARCH_DOCUMENT, con índice GIN.
+    En otros dialectos (SQLite en las pruebas) cada término debe aparecer en algún campo y se puntúa
+    más una coincidencia al inicio del campo que una en medio.
+    """
+    columns = [getattr(models.Contact, field) for field in CONTACT_FIELDS]
+    query = db.query(*columns)
+
+    if db.get_bind().dialect.name == "postgresql":
+        # Mismo texto que la expresión del índice ix_contacts_search_trgm, para que el planner lo use
+        document = literal_column(models.CONTACT_SEARCH_DOCUMENT)
+        query = query.filter(literal(q).op("<%")(document)).order_by(
+            func.word_similarity(q, document).desc(), models.Contact.id
+        )
+    else:
+        # LIKE en SQLite no distingue mayúsculas de minúsculas (ASCII); autoescape trata % y _ como literales
+        fields = [getattr(models.Contact, field) for field in models.CONTACT_SEARCH_FIELDS]
+        score = literal(0)
+        for term in q.split():
+            query = query.filter(or_(*(field.contains(term, autoescape=True) for field in fields)))
+            for field in fields:
+                score = score + case(
+                    (field.startswith(term, autoescape=True), 2),
+                    (field.contains(term, autoescape=True), 1),
+                    else_=0,
+                )
+        query = query.order_by(score.desc(), models.Contact.id)
+
+    return _contact_rows(db, query.limit(limit))
+
+def _get_departments(db: Session, names):
+    # Se resuelven antes de tocar el contacto: si el caché crea un departamento, el flush de su
+    # SAVEPOINT no debe arrastrar los cambios del contacto (un email duplicado no es una carrera de nombres)
+    return [department_cache.get(db, name) for name in dict.fromkeys(names)]  # sin nombres repetidos
 
-# === Funciones de Creación/Actualización (POST/PUT) ===
 def create_contact(db: Session, contact: schemas.ContactCreate):
-    # 1. Crear el objeto Contacto sin los departamentos
+    # 1. Obtener los departamentos (el caché los crea si no existen)
+    departments = _get_departments(db, contact.departments)
+
+    # 2. Crear el objeto Contacto con sus departamentos
     db_contact = models.Contact(
         email=contact.email, first_name=contact.first_name, last_name=contact.last_name,
         company_name=contact.company_name, address=contact.address, city=contact.city,
         state=contact.state, zip=contact.zip, phone1=contact.phone1, phone2=contact.phone2
     )
-
-    # 2. Manejar los departamentos
-    for dept_name in contact.departments:
-        # Buscar si el departamento ya existe
-        db_dept = db.query(models.Department).filter(models.Department.name == dept_name).first()
-        if not db_dept:
-            # Si no existe, lo creamos
-            db_dept = models.Department(name=dept_name)
-            db.add(db_dept)
-        # Añadimos el departamento a la lista del contacto
-        db_contact.departments.append(db_dept)
+    db_contact.departments.extend(departments)
 
     db.add(db_contact)
     db.commit()
+    contact_cache.invalidate(db_contact.id)
     db.refresh(db_contact)
     return db_contact
 
-def update_contact(db: Session, contact_id: int, contact_update: schemas.ContactCreate):
+class VersionConflict(Exception):
+    """El contacto cambió después de que el cliente (o esta transacción) leyó su versión."""
+
+    def __init__(self, current_version: Optional[int] = None):
+        super().__init__(current_version)
+        self.current_version = current_version
+
+def _apply_contact_changes(db: Session, db_contact: models.Contact, values: dict, department_names: Optional[list]) -> bool:
+    """
+    Aplica solo los valores distintos de los actuales y devuelve si hubo algún cambio. Los departamentos
+    se actualizan como diferencia de conjuntos: se borran o insertan solo las filas de asociación que cambian.
+    """
+    changed = False
+    if department_names is not None:
+        desired = set(department_names)
+        current = {department.name: department for department in db_contact.departments}
+        added = _get_departments(db, [name for name in department_names if name not in current])
+        for name, department in current.items():
+            if name not in desired:
+                db_contact.departments.remove(department)
+                changed = True
+        if added:
+            db_contact.departments.extend(added)
+            changed = True
+
+    for field, value in values.items():
+        if getattr(db_contact, field) != value:
+            setattr(db_contact, field, value)
+            changed = True
+    return changed
+
+def _commit_contact_changes(db: Session, db_contact: models.Contact) -> schemas.Contact:
+    # El UPDATE incluye "WHERE version = <leída>": si otro request lo modificó antes, no afecta filas
+    db_contact.version += 1
+    # La respuesta se arma con el estado conocido, sin el refresh (SELECT) posterior al commit
+    contact = schemas.Contact.model_validate(db_contact)
+    try:
+        db.commit()
+    except StaleDataError:
+        db.rollback()
+        current_version = db.query(models.Contact.version).filter(models.Contact.id == contact.id).scalar()
+        raise VersionConflict(current_version)
+    # Se invalida después del commit con la versión nueva: un GET concurrente que leyó la anterior ya no la cachea
+    contact_cache.invalidate(db_contact.id, contact.version)
+    return contact
+
+def update_contact(db: Session, contact_id: int, contact_update: schemas.ContactUpdate):
     db_contact = get_contact(db, contact_id)
     if not db_contact:
         return None
+    if contact_update.version is not None and contact_update.version != db_contact.version:
+        raise VersionConflict(db_contact.version)
+    values = contact_update.model_dump(exclude={"departments", "version"})
+    if not _apply_contact_changes(db, db_contact, values, contact_update.departments):
+        return schemas.Contact.model_validate(db_contact)
+    return _commit_contact_changes(db, db_contact)
 
-    # Actualizar campos simples
-    for var, value in vars(contact_update).items():
-        if var != 'departments':
-            setattr(db_contact, var, value)
-
-    # Actualizar departamentos
-    db_contact.departments.clear() # Limpiamos los departamentos existentes
-    for dept_name in contact_update.departments:
-        db_dept = db.query(models.Department).filter(models.Department.name == dept_name).first()
-        if not db_dept:
-            db_dept = models.Department(name=dept_name)
-            db.add(db_dept)
-        db_contact.departments.append(db_dept)
-    
-    db.commit()
-    db.refresh(db_contact)
-    return db_contact
\ No newline at end of file
+def patch_contact(db: Session, contact_id: int, patch: schemas.ContactPatch):
+    """Modifica solo los campos enviados; si ninguno cambia, no hay UPDATE ni commit."""
+    db_contact = get_contact(db, contact_id)
+    if not db_contact:
+        return None
+    if patch.version is not None and patch.version != db_contact.version:
+        raise VersionConflict(db_contact.version)
+
+    values = patch.model_dump(exclude_unset=True, exclude={"departments", "version"})
+    department_names = patch.departments if "departments" in patch.model_fields_set else None
+    if not _apply_contact_changes(db, db_contact, values, department_names):
+        return schemas.Contact.model_validate(db_contact)
+    return _commit_contact_changes(db, db_contact)
+
+# === Carga masiva (POST /contacts/bulk) ===
+# INSERT ... ON CONFLICT solo existe en los dialectos de PostgreSQL y SQLite (pruebas)
+INSERT_BY_DIALECT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def _insert(db: Session, table):
+    return INSERT_BY_DIALECT[db.get_bind().dialect.name](table)
+
+def _resolve_departments(db: Session, names):
+    """Devuelve {nombre: id} para todos los nombres, creando en un solo INSERT los que no existen."""
+    ids, missing = department_cache.lookup(db, names)
+    if not missing:
+        return ids
+    existing = dict(db.query(models.Department.name, models.Department.id).filter(models.Department.name.in_(missing)))
+    department_cache.remember(db, existing, committed=True)
+    ids.update(existing)
+
+    missing = [name for name in missing if name not in existing]
+    if missing:
+        db.execute(
+            _insert(db, models.Department.__table__).on_conflict_do_nothing(index_elements=["name"]),
+            [{"name": name} for name in missing],
+        )
+        created = dict(db.query(models.Department.name, models.Department.id).filter(models.Department.name.in_(missing)))
+        department_cache.remember(db, created, committed=False)
+        ids.update(created)
+    return ids
+
+def bulk_create_contacts(db: Session, rows):
+    """
+    Inserta un bloque de contactos ya validados: [(índice, schemas.ContactCreate), ...].
+    Resuelve los departamentos del bloque en una consulta, inserta los contactos con
+    INSERT ... ON CONFLICT (email) DO NOTHING multi-fila y hace un commit por bloque.
+    Devuelve un resultado por fila (en el mismo orden) en lugar de abortar ante el primer error.
+    """
+    results = {}
+    pending = {}
+    for index, contact in rows:
+        if contact.email in pending:
+            results[index] = {"index": index, "status": "error", "detail": "Duplicate email in request"}
+        else:
+            pending[contact.email] = (index, contact)
+
+    if pending:
+        try:
+            names = sorted({name for _, contact in pending.values() for name in contact.departments})
+            department_ids = _resolve_departments(db, names)
+
+            # Con una lista de parámetros SQLAlchemy agrupa las filas en INSERT multi-fila ("insertmanyvalues")
+            # y reutiliza la sentencia compilada; .values(lista) se recompilaría en cada bloque.
+            insert_contacts = (
+                _insert(db, models.Contact.__table__)
+                .on_conflict_do_nothing(index_elements=["email"])
+                .returning(models.Contact.id, models.Contact.email)
+            )
+            contacts = [contact.model_dump(exclude={"departments"}) for _, contact in pending.values()]
+            created = {email: contact_id for contact_id, email in db.execute(insert_contacts, contacts)}
+
+            associations = [
+                {"contact_id": created[email], "department_id": department_ids[name]}
+                for email, (_, contact) in pending.items() if email in created
+                for name in set(contact.departments)
+            ]
+            if associations:
+                db.execute(_insert(db, models.contact_department_association).on_conflict_do_nothing(), associations)
+            # INSERT de Core: el evento before_flush de stats no lo ve, así que los conteos se ajustan aquí
+            stats.apply_deltas(
+                db,
+                Counter(contact.state for email, (_, contact) in pending.items() if email in created),
+                Counter(association["department_id"] for association in associations),
+            )
+            db.commit()
+            for contact_id in created.values():
+                contact_cache.invalidate(contact_id)
+        except SQLAlchemyError as exc:
+            # Un error de la base de datos descarta solo este bloque; los anteriores ya están confirmados
+            db.rollback()
+            detail = f"Database error: {getattr(exc, 'orig', exc)}"
+            for email, (index, _) in pending.items():
+                results[index] = {"index": index, "status": "error", "detail": detail}
+            pending = {}
+
+        for email, (index, _) in pending.items():
+            if email in created:
+                results[index] = {"index": index, "status": "created", "id": created[email]}
+            else:
+                results[index] = {"index": index, "status": "error", "detail": "Email already registered"}
+
+    return [results[index] for index, _ in rows]
+
+# === Estadísticas (GET /stats/*), leídas de las tablas resumen que mantiene stats.py ===
+
+def get_department_stats(db: Session):
+    rows = (
+        db.query(models.Department.name, models.DepartmentStats.contact_count)
+        .join(models.DepartmentStats, models.DepartmentStats.department_id == models.Department.id)
+        .filter(models.DepartmentStats.contact_count > 0)
+        .order_by(models.Department.name)
+    )
+    return [{"department": name, "contacts": count} for name, count in rows]
+
+def get_state_stats(db: Session):
+    rows = (
+        db.query(models.StateStats.state, models.StateStats.contact_count)
+        .filter(models.StateStats.contact_count > 0)
+        .order_by(models.StateStats.state)
+    )
+    return [{"state": state, "contacts": count} for state, count in rows]
@@ -0,0 +1,71 @@
+"""
+Versiones async de las funciones de crud para DB_MODE=async.
+
+Cada función ejecuta la versión síncrona con AsyncSession.run_sync: el código ORM corre en un
+greenlet sobre el driver async (asyncpg/aiosqlite), sin ocupar un hilo del threadpool, y la lógica
+de las consultas vive en un solo lugar (crud.py).
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, models, schemas
+
+
+def with_schema(func):
+    """
+    Convierte los contactos ORM devueltos por `func` a schemas.Contact dentro de la misma llamada:
+    fuera del greenlet (o del hilo) una carga lazy de un atributo haría IO desde el event loop.
+    """
+    def wrapper(db, *args, **kwargs):
+        result = func(db, *args, **kwargs)
+        if isinstance(result, models.Contact):
+            return schemas.Contact.model_validate(result)
+        if isinstance(result, list) and result and isinstance(result[0], models.Contact):
+            return [schemas.Contact.model_validate(contact) for contact in result]
+        return result
+    return wrapper
+
+
+async def get_contact(db: AsyncSession, contact_id: int):
+    return await db.run_sync(with_schema(crud.get_contact), contact_id)
+
+async def get_contact_by_email(db: AsyncSession, email: str):
+    return await db.run_sync(with_schema(crud.get_contact_by_email), email)
+
+async def get_contacts_rows(db: AsyncSession, **filters):
+    return await db.run_sync(crud.get_contacts_rows, **filters)
+
+async def search_contacts(db: AsyncSession, q: str, limit: int = 20):
+    return await db.run_sync(crud.search_contacts, q, limit=limit)
+
+async def create_contact(db: AsyncSession, contact: schemas.ContactCreate):
+    return await db.run_sync(with_schema(crud.create_contact), contact)
+
+async def update_contact(db: AsyncSession, contact_id: int, contact_update: schemas.ContactUpdate):
+    return await db.run_sync(with_schema(crud.update_contact), contact_id, contact_update)
+
+async def patch_contact(db: AsyncSession, contact_id: int, patch: schemas.ContactPatch):
+    return await db.run_sync(with_schema(crud.patch_contact), contact_id, patch)
+
+async def bulk_create_contacts(db: AsyncSession, rows):
+    return await db.run_sync(crud.bulk_create_contacts, rows)
+
+async def get_department_stats(db: AsyncSession):
+    return await db.run_sync(crud.get_department_stats)
+
+async def get_state_stats(db: AsyncSession):
+    return await db.run_sync(crud.get_state_stats)
+
+
+# Versión async de cada función síncrona, para elegir la implementación según el tipo de sesión
+ASYNC_VERSIONS = {
+    crud.get_contact: get_contact,
+    crud.get_contact_by_email: get_contact_by_email,
+    crud.get_contacts_rows: get_contacts_rows,
+    crud.search_contacts: search_contacts,
+    crud.create_contact: create_contact,
+    crud.update_contact: update_contact,
+    crud.patch_contact: patch_contact,
+    crud.bulk_create_contacts: bulk_create_contacts,
+    crud.get_department_stats: get_department_stats,
+    crud.get_state_stats: get_state_stats,
+}
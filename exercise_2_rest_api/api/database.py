@@ -1,10 +1,45 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.orm import sessionmaker
+
+from .metrics import TimedAsyncQueuePool, TimedQueuePool, instrument_engine
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql://user:password@db/techtest_db")
+# "sync" (SessionLocal en el threadpool de FastAPI) o "async" (AsyncSession sobre asyncpg/aiosqlite)
+DB_MODE = os.getenv("DB_MODE", "sync")
+
+# Driver async que corresponde a cada dialecto de DATABASE_URL
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def to_async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{ASYNC_DRIVERS[scheme.split('+')[0]]}://{rest}"
 
-engine = create_engine(DATABASE_URL)
+# Tamaño del pool de conexiones por worker (SQLite en memoria usa su propio pool y no acepta estas opciones)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_OPTIONS = (
+    {} if DATABASE_URL.startswith("sqlite")
+    else {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_pre_ping": True}
+)
+
+# Los pools "Timed" miden la espera de checkout para /metrics
+engine = create_engine(DATABASE_URL, **POOL_OPTIONS, **({"poolclass": TimedQueuePool} if POOL_OPTIONS else {}))
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+# El engine síncrono se conserva en modo async para create_all y la ingesta
+async_engine = (
+    create_async_engine(
+        to_async_url(DATABASE_URL), **POOL_OPTIONS, **({"poolclass": TimedAsyncQueuePool} if POOL_OPTIONS else {})
+    )
+    if DB_MODE == "async" else None
+)
+if async_engine is not None:
+    instrument_engine(async_engine.sync_engine)
+# expire_on_commit=False: después del commit los atributos no se recargan de forma implícita (no hay lazy IO en async)
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False) if async_engine is not None else None
+)
@@ -1,59 +1,316 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import event, DDL
-from typing import List
+import csv
+import io
+import asyncio
+from contextlib import asynccontextmanager
 
-from . import crud, models, schemas
-from .database import SessionLocal, engine
+import orjson
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Literal, Optional, Union
 
-# Crear las tablas en la base de datos la primera vez que arranca la API
-models.Base.metadata.create_all(bind=engine)
+from . import crud, crud_async, metrics, schemas, startup
+from .cache import contact_cache, department_cache
+from .database import AsyncSessionLocal, DB_MODE, SessionLocal, async_engine, engine
 
-# 1. Definimos el DDL (Data Definition Language) como un string. Comando SQL para AÑADIR la constraint a una tabla existente.
-add_constraint_ddl = DDL(
-    "ALTER TABLE contacts ADD CONSTRAINT state_check_postgres CHECK (state ~ '^[A-Z]{2}$')"
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # La preparación de la base de datos corre en segundo plano: el worker arranca aunque Postgres
+    # todavía no responda, y /ready indica cuándo el pool ya está caliente.
+    task = asyncio.create_task(startup.prepare_database())
+    yield
+    task.cancel()
 
-# 2. Adjuntamos el evento para que se ejecute DESPUÉS de crear la tabla contacts y solo postgresql.
-event.listen(
-    models.Contact.__table__,
-    'after_create',
-    add_constraint_ddl.execute_if(dialect='postgresql')
-)
+app = FastAPI(title="Tech Test API", description="API for managing contacts", lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
 
+# Dependencia para obtener la sesión de la base de datos en cada request (según DB_MODE)
+if DB_MODE == "async":
+    async def get_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+else:
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
 
-app = FastAPI(title="Tech Test API", description="API for managing contacts")
+DbSession = Union[Session, AsyncSession]
 
-# Dependencia para obtener la sesión de la base de datos en cada request
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+async def call_crud(db: DbSession, func, *args, **kwargs):
+    """
+    Ejecuta una función de crud sin bloquear el event loop: con AsyncSession usa su versión async
+    (crud_async); con una Session síncrona la corre en el threadpool, como los endpoints `def`.
+    En ambos casos los contactos se devuelven ya convertidos a schemas.Contact.
+    """
+    if isinstance(db, AsyncSession):
+        return await crud_async.ASYNC_VERSIONS[func](db, *args, **kwargs)
+    return await run_in_threadpool(crud_async.with_schema(func), db, *args, **kwargs)
 
 @app.post("/contacts/", response_model=schemas.Contact, status_code=status.HTTP_201_CREATED)
-def create_contact(contact: schemas.ContactCreate, db: Session = Depends(get_db)):
-    db_contact = db.query(models.Contact).filter(models.Contact.email == contact.email).first()
+async def create_contact(contact: schemas.ContactCreate, db: DbSession = Depends(get_db)):
+    db_contact = await call_crud(db, crud.get_contact_by_email, contact.email)
     if db_contact:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_contact(db=db, contact=contact)
+    return await call_crud(db, crud.create_contact, contact)
+
+# Filas que se validan e insertan juntas (un INSERT y un commit por bloque)
+BULK_CHUNK_SIZE = 1000
+
+async def _iter_bulk_rows(request: Request):
+    """
+    Devuelve las filas del cuerpo una por una. NDJSON se procesa a medida que llega (sin cargar
+    todo el cuerpo en memoria); un arreglo JSON se tiene que parsear completo.
+    """
+    if "ndjson" in request.headers.get("content-type", ""):
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+        return
+
+    try:
+        rows = orjson.loads(await request.body())
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array or an NDJSON body")
+    for row in rows:
+        yield row
+
+@app.post("/contacts/bulk", response_model=schemas.BulkContactResponse)
+async def bulk_create_contacts(request: Request, db: DbSession = Depends(get_db)):
+    results = []
+    chunk = []
+
+    async def flush():
+        results.extend(await call_crud(db, crud.bulk_create_contacts, chunk))
+        chunk.clear()
+
+    index = 0
+    async for row in _iter_bulk_rows(request):
+        try:
+            data = orjson.loads(row) if isinstance(row, bytes) else row
+            chunk.append((index, schemas.ContactCreate.model_validate(data)))
+        except orjson.JSONDecodeError:
+            results.append({"index": index, "status": "error", "detail": "Invalid JSON"})
+        except ValidationError as exc:
+            results.append({"index": index, "status": "error",
+                            "detail": exc.errors(include_url=False, include_context=False, include_input=False)})
+        index += 1
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await flush()
+    if chunk:
+        await flush()
+
+    results.sort(key=lambda result: result["index"])
+    created = sum(result["status"] == "created" for result in results)
+    body = {"created": created, "failed": len(results) - created, "results": results}
+    return Response(content=orjson.dumps(body), media_type="application/json")
 
 @app.put("/contacts/{contact_id}", response_model=schemas.Contact)
-def update_contact(contact_id: int, contact: schemas.ContactCreate, db: Session = Depends(get_db)):
-    db_contact = crud.update_contact(db, contact_id=contact_id, contact_update=contact)
+async def update_contact(contact_id: int, contact: schemas.ContactUpdate, db: DbSession = Depends(get_db)):
+    try:
+        db_contact = await call_crud(db, crud.update_contact, contact_id, contact)
+    except crud.VersionConflict as exc:
+        detail = {"message": "Version conflict", "current_version": exc.current_version}
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
     if db_contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
     return db_contact
 
-@app.get("/contacts/", response_model=List[schemas.Contact])
-def read_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    contacts = crud.get_contacts(db, skip=skip, limit=limit)
-    return contacts
-
-@app.get("/contacts/{contact_id}", response_model=schemas.Contact)
-def read_contact(contact_id: int, db: Session = Depends(get_db)):
-    db_contact = crud.get_contact(db, contact_id=contact_id)
+@app.patch("/contacts/{contact_id}", response_model=schemas.Contact)
+async def patch_contact(contact_id: int, patch: schemas.ContactPatch, db: DbSession = Depends(get_db)):
+    if patch.email is not None:
+        existing = await call_crud(db, crud.get_contact_by_email, patch.email)
+        if existing and existing.id != contact_id:
+            raise HTTPException(status_code=400, detail="Email already registered")
+    try:
+        db_contact = await call_crud(db, crud.patch_contact, contact_id, patch)
+    except crud.VersionConflict as exc:
+        detail = {"message": "Version conflict", "current_version": exc.current_version}
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
     if db_contact is None:
         raise HTTPException(status_code=404, detail="Contact not found")
     return db_contact
+
+@app.get("/contacts/", response_model=List[schemas.Contact])
+async def read_contacts(
+    skip: int = Query(0, ge=0, description="Paginación por offset (obsoleta: preferir cursor)"),
+    limit: int = Query(100, ge=0),
+    cursor: Optional[str] = Query(None, description="Valor de X-Next-Cursor de la página anterior"),
+    state: Optional[str] = None,
+    city: Optional[str] = None,
+    department: Optional[str] = None,
+    db: DbSession = Depends(get_db),
+):
+    after_id = None
+    if cursor:
+        try:
+            after_id = crud.decode_cursor(cursor)
+        except crud.InvalidCursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Pedimos una fila extra para saber si existe una página siguiente sin hacer un COUNT
+    contacts = await call_crud(
+        db, crud.get_contacts_rows, skip=skip, limit=limit + 1, after_id=after_id, state=state, city=city, department=department
+    )
+    headers = {}
+    if len(contacts) > limit:
+        contacts = contacts[:limit]
+        # El cursor va en un header para no cambiar el cuerpo (lista de contactos) que ya consumen los clientes
+        if contacts:
+            headers["X-Next-Cursor"] = crud.encode_cursor(contacts[-1]["id"])
+
+    # Las filas ya tienen la forma de schemas.Contact: devolver un Response evita que FastAPI
+    # las vuelva a validar con response_model (que se conserva para la documentación de OpenAPI)
+    return Response(content=orjson.dumps(contacts), media_type="application/json", headers=headers)
+
+@app.get("/contacts/search", response_model=List[schemas.Contact])
+async def search_contacts(
+    q: str = Query(..., min_length=1, max_length=200, description="Texto a buscar en nombre, apellido, empresa, email y ciudad"),
+    limit: int = Query(20, ge=1, le=100),
+    db: DbSession = Depends(get_db),
+):
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty search query")
+    contacts = await call_crud(db, crud.search_contacts, q.strip(), limit=limit)
+    return Response(content=orjson.dumps(contacts), media_type="application/json")
+
+# Filas por lote del cursor del servidor (y por bloque escrito en la respuesta)
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CSV_COLUMNS = [*crud.CONTACT_FIELDS, "departments"]
+
+def _format_export_batch(rows, export_format: str, header: bool) -> bytes:
+    contacts = [crud.export_row(row) for row in rows]
+    if export_format == "ndjson":
+        return b"".join(orjson.dumps(contact) + b"\n" for contact in contacts)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_CSV_COLUMNS)
+    for contact in contacts:
+        # En CSV los departamentos van como nombres separados por "|"
+        names = "|".join(department["name"] for department in contact["departments"])
+        writer.writerow([*(contact[field] for field in crud.CONTACT_FIELDS), names])
+    return buffer.getvalue().encode()
+
+def _export_sync(db: Session, statement, export_format: str):
+    # Un generador síncrono: Starlette pide cada bloque en el threadpool
+    try:
+        result = db.execute(statement, execution_options={"yield_per": EXPORT_BATCH_SIZE})
+        header = True
+        for rows in result.partitions():
+            yield _format_export_batch(rows, export_format, header)
+            header = False
+        if header and export_format == "csv":
+            yield _format_export_batch([], export_format, header)
+    finally:
+        db.close()
+
+async def _export_async(db: AsyncSession, statement, export_format: str):
+    try:
+        result = await db.stream(statement, execution_options={"yield_per": EXPORT_BATCH_SIZE})
+        header = True
+        async for rows in result.partitions():
+            yield _format_export_batch(rows, export_format, header)
+            header = False
+        if header and export_format == "csv":
+            yield _format_export_batch([], export_format, header)
+    finally:
+        await db.close()
+
+@app.get("/contacts/export")
+async def export_contacts(
+    format: Literal["csv", "ndjson"] = "ndjson",
+    since_id: Optional[int] = Query(None, ge=0, description="Exporta solo contactos con id mayor (exportación incremental)"),
+    db: DbSession = Depends(get_db),
+):
+    """
+    Exporta todos los contactos en orden de id como CSV o NDJSON, en streaming y con memoria constante:
+    yield_per usa un cursor del lado del servidor en PostgreSQL y cada lote se escribe apenas se lee.
+    """
+    statement = crud.export_contacts_statement(db.get_bind().dialect.name, since_id)
+    # La sesión se cierra cuando termina el streaming, no al salir de la dependencia (Session se puede reutilizar tras close())
+    if isinstance(db, AsyncSession):
+        content = _export_async(db, statement, format)
+    else:
+        content = _export_sync(db, statement, format)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {"Content-Disposition": f'attachment; filename="contacts.{format}"'}
+    return StreamingResponse(content, media_type=media_type, headers=headers)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # La comparación de If-None-Match es débil: W/"x" equivale a "x"
+    return "*" in candidates or etag in [candidate.removeprefix("W/") for candidate in candidates]
+
+@app.get("/contacts/{contact_id}", response_model=schemas.Contact)
+async def read_contact(
+    contact_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: DbSession = Depends(get_db),
+):
+    cached = contact_cache.get(contact_id)
+    if cached is None:
+        db_contact = await call_crud(db, crud.get_contact, contact_id)
+        if db_contact is None:
+            raise HTTPException(status_code=404, detail="Contact not found")
+        body = orjson.dumps(db_contact.model_dump(mode="json"))
+        etag = contact_cache.set(contact_id, body, db_contact.version)
+    else:
+        etag, body = cached
+
+    headers = {"ETag": etag}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/stats/departments", response_model=List[schemas.DepartmentCount])
+async def read_department_stats(db: DbSession = Depends(get_db)):
+    """Contactos por departamento, desde la tabla resumen (no recorre los contactos)."""
+    return await call_crud(db, crud.get_department_stats)
+
+@app.get("/stats/states", response_model=List[schemas.StateCount])
+async def read_state_stats(db: DbSession = Depends(get_db)):
+    """Contactos por estado, desde la tabla resumen (no recorre los contactos)."""
+    return await call_crud(db, crud.get_state_stats)
+
+@app.get("/cache/contacts")
+def read_contact_cache_stats():
+    return contact_cache.stats()
+
+@app.get("/cache/departments")
+def read_department_cache_stats():
+    return department_cache.stats()
+
+@app.get("/ready")
+def read_readiness():
+    """Readiness probe: 503 hasta que el esquema existe y el pool de conexiones está precalentado."""
+    body = startup.readiness.as_dict()
+    if not startup.readiness.ready:
+        return Response(content=orjson.dumps(body), status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        media_type="application/json")
+    return body
+
+@app.get("/metrics")
+def read_metrics():
+    """Métricas en formato de texto de Prometheus (latencia por ruta, consultas por request y pool)."""
+    pools = {"sync": engine.pool}
+    if async_engine is not None:
+        pools["async"] = async_engine.pool
+    return Response(content=metrics.render_metrics(pools), media_type="text/plain; version=0.0.4")
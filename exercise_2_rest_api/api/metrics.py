@@ -0,0 +1,235 @@
+"""
+Instrumentación de la API en formato de texto de Prometheus (GET /metrics), sin dependencias externas:
+latencia por ruta, consultas SQL y tiempo de base de datos por request, y espera/saturación del pool.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import Counter as StatementCounter
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+logger = logging.getLogger(__name__)
+
+# Modo debug de N+1: se registra (WARNING) todo request que ejecute más consultas que este umbral; 0 lo desactiva
+QUERY_COUNT_WARN_THRESHOLD = int(os.getenv("QUERY_COUNT_WARN_THRESHOLD", "0"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [*zip(labelnames, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._series = {}  # etiquetas -> [conteo por bucket, suma, total]
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][position] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (bucket_counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    labels = _format_labels(self.labelnames, key, [("le", repr(float(bound)))])
+                    lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Latencia de los requests por ruta.", LATENCY_BUCKETS, ("method", "route", "status")
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Consultas SQL ejecutadas por request.", QUERY_COUNT_BUCKETS, ("method", "route")
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_seconds", "Tiempo en la base de datos por request.", LATENCY_BUCKETS, ("method", "route")
+)
+DB_QUERIES = Counter("db_queries_total", "Consultas SQL ejecutadas.")
+DB_TIME = Counter("db_query_seconds_total", "Tiempo total de las consultas SQL.")
+POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Espera para obtener una conexión del pool.", POOL_WAIT_BUCKETS, ("pool",)
+)
+SLOW_QUERY_REQUESTS = Counter(
+    "http_requests_over_query_threshold_total", "Requests que superaron QUERY_COUNT_WARN_THRESHOLD.", ("method", "route")
+)
+REGISTRY = [REQUEST_LATENCY, REQUEST_QUERIES, REQUEST_DB_TIME, DB_QUERIES, DB_TIME, POOL_WAIT, SLOW_QUERY_REQUESTS]
+
+
+# === Consultas por request (eventos de SQLAlchemy) ===
+
+# Estadísticas del request en curso; el dict es mutable, así que también lo actualizan el threadpool y run_sync
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def instrument_engine(engine):
+    """Cuenta consultas y tiempo de base de datos (totales y del request en curso) de un engine síncrono."""
+    # El inicio se guarda en el contexto de cada ejecución (no en conn.info): una sentencia que falla
+    # no llega a after_cursor_execute y no deja valores en la conexión del pool
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - context._metrics_query_start
+        DB_QUERIES.inc()
+        DB_TIME.inc(seconds)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats["queries"] += 1
+            stats["db_seconds"] += seconds
+            if QUERY_COUNT_WARN_THRESHOLD:
+                stats["statements"][statement] += 1
+
+
+# === Pool de conexiones ===
+
+class _TimedPoolMixin:
+    """Mide cuánto se espera para obtener una conexión del pool (incluye abrir una nueva)."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start, pool=self.metrics_name)
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    metrics_name = "sync"
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    metrics_name = "async"
+
+
+def _render_pool(name, pool):
+    if not isinstance(pool, QueuePool):
+        return []
+    capacity = pool.size() + max(pool._max_overflow, 0)
+    checked_out = pool.checkedout()
+    return [
+        f'db_pool_size{{pool="{name}"}} {pool.size()}',
+        f'db_pool_checked_out{{pool="{name}"}} {checked_out}',
+        f'db_pool_overflow{{pool="{name}"}} {max(pool.overflow(), 0)}',
+        f'db_pool_saturation{{pool="{name}"}} {checked_out / capacity if capacity else 0}',
+    ]
+
+
+def render_metrics(pools):
+    """Texto de exposición de Prometheus; `pools` es {nombre: pool} para las métricas de saturación."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    pool_lines = [line for name, pool in pools.items() for line in _render_pool(name, pool)]
+    if pool_lines:
+        for gauge, documentation in (
+            ("db_pool_size", "Conexiones persistentes del pool."),
+            ("db_pool_checked_out", "Conexiones en uso."),
+            ("db_pool_overflow", "Conexiones abiertas por encima de pool_size."),
+            ("db_pool_saturation", "Conexiones en uso / (pool_size + max_overflow)."),
+        ):
+            lines.append(f"# HELP {gauge} {documentation}")
+            lines.append(f"# TYPE {gauge} gauge")
+            lines.extend(line for line in pool_lines if line.startswith(gauge + "{"))
+    return "\n".join(lines) + "\n"
+
+
+# === Middleware ASGI ===
+
+class MetricsMiddleware:
+    """
+    Registra la latencia de cada request por plantilla de ruta (/contacts/{contact_id}, no el id concreto)
+    y las consultas SQL que ejecutó. Es un middleware ASGI puro para no interferir con StreamingResponse.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = {"queries": 0, "db_seconds": 0.0, "statements": StatementCounter()}
+        token = _request_stats.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            seconds = time.perf_counter() - start
+            # FastAPI deja la ruta resuelta en el scope; sin ella (404) se agrupa para no crear una serie por URL
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            REQUEST_LATENCY.observe(seconds, method=method, route=route, status=status_code)
+            REQUEST_QUERIES.observe(stats["queries"], method=method, route=route)
+            REQUEST_DB_TIME.observe(stats["db_seconds"], method=method, route=route)
+            if QUERY_COUNT_WARN_THRESHOLD and stats["queries"] > QUERY_COUNT_WARN_THRESHOLD:
+                SLOW_QUERY_REQUESTS.inc(method=method, route=route)
+                repeated = [
+                    f"{count}x {statement[:200]}" for statement, count in stats["statements"].most_common(5)
+                ]
+                logger.warning(
+                    "Posible N+1: %s %s ejecutó %d consultas (umbral %d). Más repetidas:\n%s",
+                    method, scope["path"], stats["queries"], QUERY_COUNT_WARN_THRESHOLD, "\n".join(repeated),
+                )
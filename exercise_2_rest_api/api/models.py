@@ -1,12 +1,19 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Table
+from sqlalchemy import Column, Integer, String, ForeignKey, Table, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 
+# Campos que cubre GET /contacts/search y el documento de texto (una sola cadena) sobre el que se
+# construye el índice de trigramas en PostgreSQL; la consulta debe usar exactamente la misma expresión.
+CONTACT_SEARCH_FIELDS = ("first_name", "last_name", "company_name", "email", "city")
+CONTACT_SEARCH_DOCUMENT = "(" + " || ' ' || ".join(f"coalesce({field}, '')" for field in CONTACT_SEARCH_FIELDS) + ")"
+
 # Tabla de Unión para la relación Many-to-Many
 contact_department_association = Table(
     'contact_department_association', Base.metadata,
     Column('contact_id', Integer, ForeignKey('contacts.id'), primary_key=True),
-    Column('department_id', Integer, ForeignKey('departments.id'), primary_key=True)
+    Column('department_id', Integer, ForeignKey('departments.id'), primary_key=True),
+    # La PK (contact_id, department_id) sirve para buscar por contacto; este índice cubre el filtro por departamento.
+    Index('ix_contact_department_department_id', 'department_id', 'contact_id')
 )
 
 class Department(Base):
@@ -32,9 +39,29 @@ class Contact(Base):
     zip = Column(String(10))
     phone1 = Column(String(20))
     phone2 = Column(String(20))
+    # Bloqueo optimista: cada UPDATE lleva "WHERE version = <leída>" (crud la incrementa solo si hay cambios)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     departments = relationship(
         "Department",
         secondary=contact_department_association,
         back_populates="contacts"
-    )
\ No newline at end of file
+    )
+
+    # Índices compuestos (filtro, id): permiten filtrar y paginar por cursor (id > X ORDER BY id) con el mismo índice
+    __table_args__ = (
+        Index('ix_contacts_state_id', 'state', 'id'),
+        Index('ix_contacts_city_id', 'city', 'id'),
+    )
+    __mapper_args__ = {"version_id_col": version, "version_id_generator": False}
+# Tablas resumen para GET /stats/*: se actualizan de forma incremental en cada escritura (ver stats.py),
+# así que leerlas cuesta O(número de grupos) sin importar cuántos contactos existan.
+class DepartmentStats(Base):
+    __tablename__ = "department_contact_counts"
+    department_id = Column(Integer, ForeignKey('departments.id'), primary_key=True)
+    contact_count = Column(Integer, nullable=False, default=0)
+
+class StateStats(Base):
+    __tablename__ = "state_contact_counts"
+    state = Column(String(2), primary_key=True)
+    contact_count = Column(Integer, nullable=False, default=0)
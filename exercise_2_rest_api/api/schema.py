@@ -0,0 +1,62 @@
+"""
+Creación del esquema de la base de datos. Se ejecuta como un paso explícito, no al importar la API:
+
+    python -m app.schema          # p. ej. docker-compose run --rm api python -m app.schema
+
+o al arrancar la API en segundo plano si INIT_DB_ON_STARTUP=true (por defecto).
+"""
+import logging
+
+from sqlalchemy import event, inspect, DDL
+
+from . import models, stats
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+# 1. Definimos el DDL (Data Definition Language) como un string. Comando SQL para AÑADIR la constraint a una tabla existente.
+add_constraint_ddl = DDL(
+    "ALTER TABLE contacts ADD CONSTRAINT state_check_postgres CHECK (state ~ '^[A-Z]{2}$')"
+)
+
+# 2. Adjuntamos el evento para que se ejecute DESPUÉS de crear la tabla contacts y solo postgresql.
+event.listen(
+    models.Contact.__table__,
+    'after_create',
+    add_constraint_ddl.execute_if(dialect='postgresql')
+)
+
+# 3. DDL idempotente (IF NOT EXISTS) que init_db ejecuta siempre en PostgreSQL: create_all no modifica
+#    tablas existentes, así que una base de datos creada con una versión anterior (p. ej. el volumen
+#    postgres_data) también recibe lo que se agregó después.
+POSTGRES_UPGRADE_DDL = [
+    # Columna version (bloqueo optimista)
+    DDL("ALTER TABLE contacts ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1"),
+    # Índice GIN de trigramas para GET /contacts/search (misma expresión que usa crud.search_contacts)
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+    DDL(f"CREATE INDEX IF NOT EXISTS ix_contacts_search_trgm ON contacts USING gin ({models.CONTACT_SEARCH_DOCUMENT} gin_trgm_ops)"),
+]
+
+
+def init_db(bind=engine):
+    """Crea las tablas que no existen (y dispara el evento after_create de arriba) y aplica POSTGRES_UPGRADE_DDL."""
+    stats_table_exists = inspect(bind).has_table(models.StateStats.__tablename__)
+    models.Base.metadata.create_all(bind=bind)
+    # create_all solo crea los índices junto con su tabla: los agregados después (filtros de GET /contacts/,
+    # búsqueda por departamento) se crean aquí si faltan
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    if bind.dialect.name == "postgresql":
+        with bind.begin() as conn:
+            for statement in POSTGRES_UPGRADE_DDL:
+                conn.execute(statement)
+    if not stats_table_exists:
+        # Tablas resumen nuevas en una base de datos que puede tener contactos: se calculan desde cero
+        stats.rebuild(bind=bind)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    logger.info("Esquema de la base de datos creado/verificado")
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, constr, ConfigDict
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, constr, ConfigDict, field_validator
+from typing import Any, Optional, List
 
 # Schema para la respuesta del Departamento
 class Department(BaseModel):
@@ -26,8 +26,60 @@ class ContactCreate(ContactBase):
     # departamento como lista de strings
     departments: List[str] = []
 
+# Schema para PUT: reemplaza el contacto completo
+class ContactUpdate(ContactCreate):
+    # Versión que leyó el cliente: si otro request modificó el contacto después, se responde 409
+    version: Optional[int] = None
+
+# Schema para PATCH: solo se modifican los campos enviados
+class ContactPatch(BaseModel):
+    first_name: Optional[constr(min_length=1)] = None
+    last_name: Optional[constr(min_length=1)] = None
+    email: Optional[EmailStr] = None
+    company_name: Optional[str] = None
+    address: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[constr(strip_whitespace=True, to_upper=True, min_length=2, max_length=2, pattern=r'^[A-Z]{2}$')] = None
+    zip: Optional[str] = None
+    phone1: Optional[str] = None
+    phone2: Optional[str] = None
+    # Si se envía, reemplaza el conjunto de departamentos
+    departments: Optional[List[str]] = None
+    # Versión que leyó el cliente: si otro request modificó el contacto después, se responde 409
+    version: Optional[int] = None
+
+    @field_validator("first_name", "last_name", "email", "state", "departments")
+    @classmethod
+    def not_null(cls, value):
+        # Opcionales para omitirlos, pero no se pueden borrar (las columnas son NOT NULL)
+        if value is None:
+            raise ValueError("may not be null")
+        return value
+
 # Schema para la respuesta de la API
 class Contact(ContactBase):
     id: int
+    version: int = 1
     departments: List[Department] = []
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+# Schemas para la respuesta de la carga masiva (una entrada por fila recibida)
+class BulkContactResult(BaseModel):
+    index: int
+    status: str  # "created" o "error"
+    id: Optional[int] = None
+    detail: Optional[Any] = None
+
+class BulkContactResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[BulkContactResult]
+
+# Schemas de GET /stats/departments y GET /stats/states
+class DepartmentCount(BaseModel):
+    department: str
+    contacts: int
+
+class StateCount(BaseModel):
+    state: str
+    contacts: int
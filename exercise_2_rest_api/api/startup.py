@@ -0,0 +1,112 @@
+"""
+Preparación de la base de datos al arrancar la API: crea el esquema (opcional), abre de antemano
+conexiones del pool y ejecuta una vez las consultas más usadas, para que los primeros requests no
+paguen el establecimiento de conexiones ni la compilación de sentencias. /ready refleja el resultado.
+"""
+import asyncio
+import logging
+import os
+import time
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from . import crud, schema
+from .cache import department_cache
+from .database import DB_MODE, DB_POOL_SIZE, async_engine, engine
+
+logger = logging.getLogger(__name__)
+
+# Crear las tablas al arrancar; en producción se puede desactivar y ejecutar `python -m app.schema` como paso de despliegue
+INIT_DB_ON_STARTUP = os.getenv("INIT_DB_ON_STARTUP", "true").lower() == "true"
+# Conexiones que se abren al arrancar (no más que el tamaño del pool, para que no se descarten al devolverlas)
+DB_POOL_WARM_CONNECTIONS = int(os.getenv("DB_POOL_WARM_CONNECTIONS", str(DB_POOL_SIZE)))
+MAX_RETRY_DELAY_SECONDS = 30
+
+
+class Readiness:
+    def __init__(self):
+        self.ready = False
+        self.warm_connections = 0
+        self.startup_seconds = None
+        self.last_error = None
+
+    def as_dict(self):
+        return {
+            "status": "ready" if self.ready else "starting",
+            "warm_connections": self.warm_connections,
+            "startup_seconds": self.startup_seconds,
+            "last_error": self.last_error,
+        }
+
+
+readiness = Readiness()
+
+
+def run_hot_statements(db: Session):
+    """Ejecuta una vez las consultas de los endpoints más usados (compila y cachea las sentencias)."""
+    crud.get_contact(db, 0)
+    crud.get_contact_by_email(db, "")
+    crud.get_contacts_rows(db, limit=1)
+
+
+def warm_pool(bind, connections):
+    """Abre `connections` conexiones a la vez (el pool las conserva al devolverlas) y prepara las sentencias en cada una."""
+    held = []
+    try:
+        for _ in range(connections):
+            connection = bind.connect()
+            held.append(connection)
+            with Session(bind=connection) as db:
+                run_hot_statements(db)
+        with Session(bind=bind) as db:
+            department_cache.warm(db)
+    finally:
+        for connection in held:
+            connection.close()
+    return len(held)
+
+
+async def warm_pool_async(bind, connections):
+    """Versión para AsyncEngine: con asyncpg cada conexión además guarda sus sentencias preparadas."""
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+    held = []
+    try:
+        for _ in range(connections):
+            connection = await bind.connect()
+            held.append(connection)
+            async with AsyncSession(bind=connection) as db:
+                await db.run_sync(run_hot_statements)
+        async with AsyncSession(bind=bind) as db:
+            await db.run_sync(department_cache.warm)
+    finally:
+        for connection in held:
+            await connection.close()
+    return len(held)
+
+
+async def prepare_database():
+    """Reintenta (con backoff) hasta que la base de datos responde; no detiene el worker si aún no está disponible."""
+    start = time.perf_counter()
+    delay = 1
+    while True:
+        try:
+            if INIT_DB_ON_STARTUP:
+                await run_in_threadpool(schema.init_db, engine)
+            if DB_MODE == "async":
+                warmed = await warm_pool_async(async_engine, DB_POOL_WARM_CONNECTIONS)
+            else:
+                warmed = await run_in_threadpool(warm_pool, engine, DB_POOL_WARM_CONNECTIONS)
+            break
+        except Exception as exc:  # Errores de conexión del driver (OperationalError, OSError, ...)
+            readiness.last_error = str(exc)
+            logger.warning("La base de datos no está lista (%s); reintentando en %ss", exc, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY_SECONDS)
+
+    readiness.warm_connections = warmed
+    readiness.startup_seconds = round(time.perf_counter() - start, 3)
+    readiness.last_error = None
+    readiness.ready = True
+    logger.info("Base de datos lista: %d conexiones precalentadas en %.3fs", warmed, readiness.startup_seconds)
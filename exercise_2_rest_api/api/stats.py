@@ -0,0 +1,100 @@
+"""
+Mantenimiento de las tablas resumen de GET /stats/departments y GET /stats/states.
+
+Las escrituras del ORM (create_contact, update_contact, patch_contact) se contabilizan en un evento
+before_flush a partir del historial de cada contacto; la carga masiva, que usa INSERT de Core, llama
+a apply_deltas directamente. En ambos casos el ajuste va en la misma transacción que el contacto.
+
+Reconstrucción completa (reparación, o después de escribir por fuera de la API):
+
+    python -m app.stats          # p. ej. docker-compose run --rm api python -m app.stats
+"""
+import logging
+from collections import Counter
+
+from sqlalchemy import delete, event, func, inspect, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import engine
+
+logger = logging.getLogger(__name__)
+
+# INSERT ... ON CONFLICT DO UPDATE solo existe en los dialectos de PostgreSQL y SQLite (pruebas)
+UPSERT_BY_DIALECT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def apply_deltas(db: Session, state_deltas: Counter, department_deltas: Counter):
+    """Suma los deltas {estado: n} y {department_id: n} a las tablas resumen con un upsert por tabla."""
+    insert = UPSERT_BY_DIALECT[db.get_bind().dialect.name]
+    for model, key, deltas in (
+        (models.StateStats, "state", state_deltas),
+        (models.DepartmentStats, "department_id", department_deltas),
+    ):
+        # Orden fijo de las claves: dos transacciones que tocan los mismos grupos bloquean las filas en el mismo orden
+        rows = [{key: group, "contact_count": delta} for group, delta in sorted(deltas.items()) if delta]
+        if not rows:
+            continue
+        statement = insert(model.__table__)
+        statement = statement.on_conflict_do_update(
+            index_elements=[key],
+            set_={"contact_count": model.__table__.c.contact_count + statement.excluded.contact_count},
+        )
+        db.connection().execute(statement, rows)
+
+
+def _contact_deltas(session):
+    state_deltas, department_deltas = Counter(), Counter()
+    for contact in (*session.new, *session.dirty):
+        if not isinstance(contact, models.Contact):
+            continue
+        attrs = inspect(contact).attrs
+        state = attrs.state.history
+        state_deltas.update(value for value in state.added if value is not None)
+        state_deltas.subtract(value for value in state.deleted if value is not None)
+        departments = attrs.departments.history
+        department_deltas.update(department.id for department in departments.added)
+        department_deltas.subtract(department.id for department in departments.deleted)
+
+    for contact in session.deleted:
+        if isinstance(contact, models.Contact):
+            state_deltas.subtract([contact.state])
+            department_deltas.subtract(department.id for department in contact.departments)
+    return state_deltas, department_deltas
+
+
+def _record_flush(session, flush_context, instances):
+    state_deltas, department_deltas = _contact_deltas(session)
+    if any(state_deltas.values()) or any(department_deltas.values()):
+        apply_deltas(session, state_deltas, department_deltas)
+
+
+event.listen(Session, "before_flush", _record_flush)
+
+
+def rebuild(bind=engine):
+    """Recalcula ambas tablas resumen desde contacts y la tabla de asociación, en una sola transacción."""
+    with bind.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            # Las escrituras concurrentes esperan al final de la reconstrucción: su delta se suma al nuevo conteo
+            conn.execute(text("LOCK TABLE state_contact_counts, department_contact_counts IN EXCLUSIVE MODE"))
+        conn.execute(delete(models.StateStats))
+        conn.execute(delete(models.DepartmentStats))
+
+        contacts = models.Contact.__table__
+        association = models.contact_department_association
+        conn.execute(models.StateStats.__table__.insert().from_select(
+            ["state", "contact_count"],
+            select(contacts.c.state, func.count()).group_by(contacts.c.state),
+        ))
+        conn.execute(models.DepartmentStats.__table__.insert().from_select(
+            ["department_id", "contact_count"],
+            select(association.c.department_id, func.count()).group_by(association.c.department_id),
+        ))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    rebuild()
+    logger.info("Tablas resumen de /stats reconstruidas")
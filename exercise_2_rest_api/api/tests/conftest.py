@@ -1,11 +1,16 @@
+import asyncio
+
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from app.main import app, get_db
+from app.cache import contact_cache, department_cache
 from app.database import Base
+from app.metrics import instrument_engine
 
 # --- Configuración de la Base de Datos de Prueba ---
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -17,6 +22,19 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Misma base de datos en memoria para el modo async (DB_MODE=async), con aiosqlite
+async_engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Los engines de prueba reemplazan a los de database.py, así que también se instrumentan para /metrics
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+
+async def _recreate_async_tables():
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
 # --- Fixtures de Pytest ---
 
 @pytest.fixture(scope="function")
@@ -26,6 +44,9 @@ def db_session():
     """
     # Crea todas las tablas antes de que se ejecute la prueba
     Base.metadata.create_all(bind=engine)
+    # Los ids en caché pertenecen a la base de datos de la prueba anterior
+    department_cache.invalidate()
+    contact_cache.clear()
     db = TestingSessionLocal()
     try:
         yield db
@@ -35,9 +56,26 @@ def db_session():
         Base.metadata.drop_all(bind=engine)
 
 @pytest.fixture(scope="function")
-def client(db_session):
+def sql_statements():
+    """
+    Fixture que registra las sentencias SQL ejecutadas en ambas bases de datos de prueba.
+    """
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = [engine, async_engine.sync_engine]
+    for target in engines:
+        event.listen(target, "before_cursor_execute", record)
+    yield statements
+    for target in engines:
+        event.remove(target, "before_cursor_execute", record)
+
+@pytest.fixture(scope="function", params=["sync", "async"])
+def client(request, db_session):
     """
     Fixture para crear un cliente de API que usa la base de datos de prueba.
+    Cada prueba se ejecuta con la sesión síncrona y con AsyncSession (DB_MODE=async).
     """
     # Función para sobreescribir la dependencia get_db
     def override_get_db():
@@ -46,8 +84,16 @@ def client(db_session):
         finally:
             db_session.close()
 
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
     # Aplicamos la sobreescritura
-    app.dependency_overrides[get_db] = override_get_db
+    if request.param == "async":
+        asyncio.run(_recreate_async_tables())
+        app.dependency_overrides[get_db] = override_get_async_db
+    else:
+        app.dependency_overrides[get_db] = override_get_db
     
     # Creamos y devolvemos el cliente de prueba
     yield TestClient(app)
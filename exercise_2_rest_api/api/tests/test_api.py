@@ -1,3 +1,8 @@
+import asyncio
+import csv
+import io
+import json
+
 def test_create_contact(client):
     """Prueba la creación de un nuevo contacto."""
     response = client.post(
@@ -126,4 +131,495 @@ def test_create_contact_empty_first_name(client):
     assert response.status_code == 422
     data = response.json()
     assert "first_name" in data["detail"][0]["loc"]
-    assert "String should have at least 1 character" in data["detail"][0]["msg"]
\ No newline at end of file
+    assert "String should have at least 1 character" in data["detail"][0]["msg"]
+
+
+def test_read_contacts_cursor_pagination(client):
+    """Prueba recorrer la lista completa con el cursor de X-Next-Cursor."""
+    for i in range(5):
+        client.post(
+            "/contacts/",
+            json={"first_name": "Page", "last_name": str(i), "email": f"page{i}@example.com", "state": "CA"}
+        )
+
+    emails = []
+    response = client.get("/contacts/", params={"limit": 2})
+    while True:
+        assert response.status_code == 200
+        emails += [contact["email"] for contact in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        response = client.get("/contacts/", params={"limit": 2, "cursor": cursor})
+
+    assert emails == [f"page{i}@example.com" for i in range(5)]
+    # limit conserva el comportamiento anterior: sin máximo, y 0 devuelve una lista vacía
+    assert len(client.get("/contacts/", params={"limit": 5000}).json()) == 5
+    assert client.get("/contacts/", params={"limit": 0}).json() == []
+
+def test_read_contacts_invalid_cursor(client):
+    """Prueba que un cursor mal formado devuelva 400."""
+    response = client.get("/contacts/", params={"cursor": "no-es-un-cursor"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+def test_read_contacts_filters(client):
+    """Prueba los filtros por state, city y department."""
+    client.post(
+        "/contacts/",
+        json={"first_name": "Ann", "last_name": "A", "email": "ann@example.com", "state": "CA",
+              "city": "Los Angeles", "departments": ["Sales", "Marketing"]}
+    )
+    client.post(
+        "/contacts/",
+        json={"first_name": "Bob", "last_name": "B", "email": "bob@example.com", "state": "NY",
+              "city": "New York", "departments": ["Sales"]}
+    )
+
+    by_state = client.get("/contacts/", params={"state": "ny"}).json()
+    assert [c["email"] for c in by_state] == ["bob@example.com"]
+
+    by_city = client.get("/contacts/", params={"city": "Los Angeles"}).json()
+    assert [c["email"] for c in by_city] == ["ann@example.com"]
+
+    by_department = client.get("/contacts/", params={"department": "Sales"}).json()
+    assert [c["email"] for c in by_department] == ["ann@example.com", "bob@example.com"]
+    # El filtro no recorta los departamentos que se devuelven de cada contacto
+    assert len(by_department[0]["departments"]) == 2
+
+    combined = client.get("/contacts/", params={"department": "Marketing", "state": "NY"}).json()
+    assert combined == []
+
+def test_read_contacts_same_shape_as_contact_schema(client):
+    """Prueba que la lista serializada con orjson tenga la misma forma que GET /contacts/{id}."""
+    response = client.post(
+        "/contacts/",
+        json={"first_name": "Shape", "last_name": "Check", "email": "shape@example.com", "state": "OR",
+              "city": "Portland", "zip": "97201", "departments": ["Support", "Finances"]}
+    )
+    contact_id = response.json()["id"]
+
+    list_response = client.get("/contacts/")
+    assert list_response.headers["content-type"] == "application/json"
+    detail = client.get(f"/contacts/{contact_id}").json()
+    listed = list_response.json()[0]
+    assert list(listed) == list(detail)
+    assert listed == detail
+
+def test_bulk_create_contacts_ndjson(client):
+    """Prueba la carga masiva en NDJSON con resultados por fila sin abortar el lote."""
+    client.post(
+        "/contacts/",
+        json={"first_name": "Old", "last_name": "User", "email": "old@example.com", "state": "TX"}
+    )
+    lines = [
+        '{"first_name": "Bulk", "last_name": "One", "email": "bulk1@example.com", "state": "CA", "departments": ["Sales", "Support"]}',
+        '{"first_name": "Bulk", "last_name": "Two", "email": "bulk2@example.com", "state": "NY", "departments": ["Sales"]}',
+        '{"first_name": "Bulk", "last_name": "Bad", "email": "not-an-email", "state": "NY"}',
+        '{"first_name": "Old", "last_name": "Again", "email": "old@example.com", "state": "TX"}',
+        '{"first_name": "Bulk", "last_name": "Copy", "email": "bulk1@example.com", "state": "CA"}',
+        'esto no es json',
+    ]
+    response = client.post(
+        "/contacts/bulk",
+        content="\n".join(lines) + "\n",
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["created"] == 2
+    assert data["failed"] == 4
+    statuses = [(r["index"], r["status"]) for r in data["results"]]
+    assert statuses == [(0, "created"), (1, "created"), (2, "error"), (3, "error"), (4, "error"), (5, "error")]
+    assert data["results"][3]["detail"] == "Email already registered"
+    assert data["results"][4]["detail"] == "Duplicate email in request"
+    assert data["results"][5]["detail"] == "Invalid JSON"
+
+    contact = client.get(f"/contacts/{data['results'][0]['id']}").json()
+    assert contact["state"] == "CA"
+    assert sorted(d["name"] for d in contact["departments"]) == ["Sales", "Support"]
+    # El departamento compartido se creó una sola vez
+    sales_ids = {d["id"] for c in client.get("/contacts/", params={"department": "Sales"}).json()
+                 for d in c["departments"] if d["name"] == "Sales"}
+    assert len(sales_ids) == 1
+
+def test_bulk_create_contacts_json_array(client):
+    """Prueba la carga masiva con un arreglo JSON y el rechazo de cuerpos que no son arreglos."""
+    response = client.post(
+        "/contacts/bulk",
+        json=[{"first_name": "Array", "last_name": "User", "email": "array@example.com", "state": "WA"}],
+    )
+    assert response.status_code == 200
+    assert response.json()["created"] == 1
+
+    response = client.post("/contacts/bulk", json={"first_name": "Not", "last_name": "A list"})
+    assert response.status_code == 400
+
+def test_department_cache(client, db_session):
+    """Prueba que las escrituras reutilicen los departamentos en caché y que cuenten hits/misses."""
+    # Los contadores son globales al proceso: se comparan contra el valor inicial
+    before = client.get("/cache/departments").json()
+    first = client.post(
+        "/contacts/",
+        json={"first_name": "Cache", "last_name": "One", "email": "cache1@example.com", "state": "CA",
+              "departments": ["Sales"]}
+    ).json()
+    stats = client.get("/cache/departments").json()
+    assert stats["misses"] == before["misses"] + 1
+    assert stats["size"] == 1
+
+    second = client.post(
+        "/contacts/",
+        json={"first_name": "Cache", "last_name": "Two", "email": "cache2@example.com", "state": "CA",
+              "departments": ["Sales"]}
+    ).json()
+    assert client.get("/cache/departments").json()["hits"] == stats["hits"] + 1
+    assert second["departments"] == first["departments"]
+
+def test_department_cache_concurrent_creation(db_session):
+    """Prueba que un nombre creado por otra transacción entre el SELECT y el INSERT se relea sin error."""
+    from app import models
+    from app.cache import DepartmentCache
+
+    # Otra transacción ya confirmó el departamento que este request intenta crear
+    db_session.add(models.Department(name="Race"))
+    db_session.commit()
+
+    cache = DepartmentCache()
+    department_id = cache._create(db_session, "Race")  # el INSERT choca con el UNIQUE de name
+    assert department_id == db_session.query(models.Department.id).filter_by(name="Race").scalar()
+    assert cache.stats()["size"] == 1
+
+def test_read_contact_etag_not_modified(client, sql_statements):
+    """Prueba que GET /contacts/{id} devuelva ETag y que If-None-Match responda 304 sin consultar la BD."""
+    contact_id = client.post(
+        "/contacts/",
+        json={"first_name": "Etag", "last_name": "User", "email": "etag@example.com", "state": "NV"}
+    ).json()["id"]
+
+    response = client.get(f"/contacts/{contact_id}")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    sql_statements.clear()
+    cached = client.get(f"/contacts/{contact_id}")
+    assert cached.json() == response.json()
+    not_modified = client.get(f"/contacts/{contact_id}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == etag
+    assert sql_statements == []
+
+def test_read_contact_cache_invalidated_on_update(client):
+    """Prueba que PUT invalide el contacto en caché y cambie su ETag."""
+    contact = {"first_name": "Before", "last_name": "Update", "email": "inval@example.com", "state": "NV"}
+    contact_id = client.post("/contacts/", json=contact).json()["id"]
+    etag = client.get(f"/contacts/{contact_id}").headers["ETag"]
+
+    client.put(f"/contacts/{contact_id}", json={**contact, "first_name": "After"})
+    response = client.get(f"/contacts/{contact_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["first_name"] == "After"
+    assert response.headers["ETag"] != etag
+
+def test_contact_cache_backends():
+    """Prueba los backends LRU+TTL y Redis (con fakeredis) del caché de contactos."""
+    import fakeredis
+    from app.cache import ContactCache, LRUTTLBackend, RedisBackend
+
+    for backend in [LRUTTLBackend(max_entries=2), RedisBackend(fakeredis.FakeRedis())]:
+        cache = ContactCache(backend)
+        etag = cache.set(1, b'{"id":1}', version=1)
+        assert cache.get(1) == (etag, b'{"id":1}')
+        cache.invalidate(1)
+        assert cache.get(1) is None
+
+        # Después de invalidar la versión 3, ni la versión 2 ni una invalidación tardía de la 2 se guardan
+        cache.invalidate(1, version=3)
+        cache.invalidate(1, version=2)
+        cache.set(1, b'{"version":2}', version=2)
+        assert cache.get(1) is None
+        etag = cache.set(1, b'{"version":3}', version=3)
+        assert cache.get(1) == (etag, b'{"version":3}')
+
+    lru = ContactCache(LRUTTLBackend(max_entries=2))
+    for contact_id in (1, 2, 3):
+        lru.set(contact_id, b"{}", version=1)
+    assert lru.get(1) is None  # la entrada menos usada se descarta
+
+    expired = ContactCache(LRUTTLBackend(ttl_seconds=0))
+    expired.set(1, b"{}", version=1)
+    assert expired.get(1) is None
+
+def test_read_contact_cache_ignores_stale_write(client):
+    """Prueba la carrera GET (lee) -> PATCH -> GET (escribe en caché): la versión anterior no queda en caché."""
+    from app.cache import contact_cache
+
+    contact = {"first_name": "Race", "last_name": "Read", "email": "race@example.com", "state": "NV"}
+    contact_id = client.post("/contacts/", json=contact).json()["id"]
+    stale = client.get(f"/contacts/{contact_id}")
+    contact_cache.clear()
+
+    # El PATCH se confirma e invalida mientras el primer GET todavía no escribió en el caché
+    assert client.patch(f"/contacts/{contact_id}", json={"first_name": "Fresh"}).status_code == 200
+    contact_cache.set(contact_id, stale.content, stale.json()["version"])
+
+    response = client.get(f"/contacts/{contact_id}", headers={"If-None-Match": stale.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.json()["first_name"] == "Fresh"
+
+def test_search_contacts(client):
+    """Prueba la búsqueda por nombre, empresa y ciudad, ordenada por relevancia."""
+    for first_name, last_name, company, city, email in [
+        ("John", "Smith", "Acme Corp", "Austin", "john@example.com"),
+        ("Johnny", "Walker", "Globex", "Boston", "johnny@example.com"),
+        ("Mary", "Johnson", "Acme Corp", "Denver", "mary@example.com"),
+    ]:
+        client.post(
+            "/contacts/",
+            json={"first_name": first_name, "last_name": last_name, "company_name": company,
+                  "city": city, "email": email, "state": "TX", "departments": ["Sales"]}
+        )
+
+    response = client.get("/contacts/search", params={"q": "john"})
+    assert response.status_code == 200
+    emails = [contact["email"] for contact in response.json()]
+    # Todos coinciden, pero las coincidencias al inicio de un campo van primero
+    assert set(emails) == {"john@example.com", "johnny@example.com", "mary@example.com"}
+    assert emails[-1] == "mary@example.com"
+    assert response.json()[0]["departments"][0]["name"] == "Sales"
+
+    acme = client.get("/contacts/search", params={"q": "acme denver"}).json()
+    assert [contact["email"] for contact in acme] == ["mary@example.com"]
+
+    assert client.get("/contacts/search", params={"q": "zzz"}).json() == []
+    assert client.get("/contacts/search", params={"q": "   "}).status_code == 400
+
+def test_export_contacts(client):
+    """Prueba la exportación en NDJSON y CSV, con departamentos agregados y exportación incremental."""
+    ids = []
+    for i, departments in enumerate([["Sales", "Support"], [], ["Sales"]]):
+        response = client.post(
+            "/contacts/",
+            json={"first_name": "Export", "last_name": str(i), "email": f"export{i}@example.com",
+                  "state": "FL", "departments": departments}
+        )
+        ids.append(response.json()["id"])
+
+    response = client.get("/contacts/export", params={"format": "ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == ids
+    assert sorted(d["name"] for d in rows[0]["departments"]) == ["Sales", "Support"]
+    assert rows[1]["departments"] == []
+    # Misma forma que GET /contacts/{id}
+    assert list(rows[2]) == list(client.get(f"/contacts/{ids[2]}").json())
+
+    incremental = client.get("/contacts/export", params={"format": "ndjson", "since_id": ids[0]})
+    assert [json.loads(line)["id"] for line in incremental.text.splitlines()] == ids[1:]
+
+    csv_response = client.get("/contacts/export", params={"format": "csv"})
+    assert csv_response.headers["content-type"].startswith("text/csv")
+    records = list(csv.DictReader(io.StringIO(csv_response.text)))
+    assert [int(record["id"]) for record in records] == ids
+    assert sorted(records[0]["departments"].split("|")) == ["Sales", "Support"]
+
+    empty = client.get("/contacts/export", params={"format": "csv", "since_id": ids[-1]})
+    assert empty.text.strip() == ",".join(csv.DictReader(io.StringIO(csv_response.text)).fieldnames)
+
+def test_ready_after_pool_warm_up(client, db_session, monkeypatch):
+    """Prueba que /ready responda 503 hasta que termina la preparación de la base de datos."""
+    from app import startup
+
+    monkeypatch.setattr(startup, "readiness", startup.Readiness())
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "starting"
+
+    # Preparación contra la base de datos de prueba, en modo sync
+    monkeypatch.setattr(startup, "engine", db_session.get_bind())
+    monkeypatch.setattr(startup, "DB_MODE", "sync")
+    monkeypatch.setattr(startup, "DB_POOL_WARM_CONNECTIONS", 2)
+    asyncio.run(startup.prepare_database())
+
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+    assert response.json()["warm_connections"] == 2
+
+def test_metrics_records_route_latency_and_queries(client, db_session):
+    """Prueba que /metrics exponga la latencia por plantilla de ruta y las consultas por request."""
+    get_count = 'http_request_duration_seconds_count{method="GET",route="/contacts/{contact_id}",status="200"}'
+    post_queries = 'http_request_db_queries_sum{method="POST",route="/contacts/"}'
+
+    def sample(name):
+        # Los histogramas son globales del proceso: se compara contra el valor previo, no contra el total
+        line = next((line for line in client.get("/metrics").text.splitlines() if line.startswith(name + " ")), None)
+        return float(line.split()[-1]) if line else 0.0
+
+    get_before, post_before = sample(get_count), sample(post_queries)
+    created = client.post("/contacts/", json={"first_name": "Metric", "last_name": "Route", "email": "metrics@example.com", "state": "NV"})
+    contact_id = created.json()["id"]
+    client.get(f"/contacts/{contact_id}")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    # La ruta se etiqueta con su plantilla, no con el id concreto
+    assert f"/contacts/{contact_id}\"" not in text
+    assert "# TYPE http_request_db_queries histogram" in text
+    assert sample(get_count) == get_before + 1
+    assert sample(post_queries) > post_before
+
+def test_query_threshold_logs_possible_n_plus_one(client, db_session, monkeypatch, caplog):
+    """Prueba que el modo debug registre los requests que superan QUERY_COUNT_WARN_THRESHOLD."""
+    from app import metrics
+
+    monkeypatch.setattr(metrics, "QUERY_COUNT_WARN_THRESHOLD", 1)
+    with caplog.at_level("WARNING", logger="app.metrics"):
+        client.post("/contacts/", json={"first_name": "N", "last_name": "One", "email": "n1@example.com", "state": "NV", "departments": ["Sales"]})
+    assert any("Posible N+1: POST /contacts/" in record.getMessage() for record in caplog.records)
+
+    caplog.clear()
+    with caplog.at_level("WARNING", logger="app.metrics"):
+        client.get("/metrics")
+    assert not caplog.records
+
+def test_metrics_failed_statement_does_not_leak(db_session):
+    """Prueba que una sentencia que falla no deje tiempos de inicio pendientes en la conexión."""
+    import pytest
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from app import metrics
+
+    connection = db_session.connection()
+    with pytest.raises(OperationalError):
+        connection.execute(text("SELECT * FROM tabla_inexistente"))
+    db_session.rollback()
+
+    connection = db_session.connection()
+    before = metrics.DB_QUERIES._values.get((), 0)
+    assert connection.execute(text("SELECT 1")).scalar() == 1
+    assert metrics.DB_QUERIES._values[()] == before + 1
+    assert "query_start" not in connection.info
+
+def test_patch_contact_only_writes_changes(client, sql_statements):
+    """Prueba que PATCH modifique solo los campos enviados y no escriba nada si los valores no cambian."""
+    contact = {"first_name": "Patch", "last_name": "Me", "email": "patch@example.com", "state": "TX",
+               "city": "Austin", "departments": ["Sales", "Support"]}
+    created = client.post("/contacts/", json=contact).json()
+    assert created["version"] == 1
+
+    sql_statements.clear()
+    unchanged = client.patch(f"/contacts/{created['id']}", json={"city": "Austin", "departments": ["Support", "Sales"]})
+    assert unchanged.status_code == 200
+    assert unchanged.json()["version"] == 1
+    assert not [s for s in sql_statements if s.startswith(("UPDATE", "DELETE", "INSERT"))]
+
+    sql_statements.clear()
+    response = client.patch(f"/contacts/{created['id']}", json={"city": "Dallas", "departments": ["Support", "Finance"]})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["city"] == "Dallas"
+    assert data["first_name"] == "Patch"
+    assert data["version"] == 2
+    assert sorted(d["name"] for d in data["departments"]) == ["Finance", "Support"]
+    # Diferencia de conjuntos: se borra solo Sales y se inserta solo Finance
+    association_writes = [s for s in sql_statements if "contact_department_association" in s and not s.startswith("SELECT")]
+    assert len(association_writes) == 2
+    assert client.get(f"/contacts/{created['id']}").json() == data
+
+def test_patch_contact_version_conflict(client):
+    """Prueba el bloqueo optimista: un PATCH con una versión desactualizada responde 409."""
+    contact = {"first_name": "Opt", "last_name": "Lock", "email": "lock@example.com", "state": "WA"}
+    contact_id = client.post("/contacts/", json=contact).json()["id"]
+
+    first = client.patch(f"/contacts/{contact_id}", json={"phone1": "555-0001", "version": 1})
+    assert first.status_code == 200
+    assert first.json()["version"] == 2
+
+    stale = client.patch(f"/contacts/{contact_id}", json={"phone1": "555-0002", "version": 1})
+    assert stale.status_code == 409
+    assert stale.json()["detail"]["current_version"] == 2
+    assert client.get(f"/contacts/{contact_id}").json()["phone1"] == "555-0001"
+
+    # PUT también incrementa la versión
+    assert client.put(f"/contacts/{contact_id}", json={**contact, "city": "Seattle"}).json()["version"] == 3
+
+def test_put_contact_version_conflict(client):
+    """Prueba que PUT responda 409 con una versión desactualizada o si el contacto cambia durante el request."""
+    from sqlalchemy import event, text
+    from sqlalchemy.orm import Session
+
+    contact = {"first_name": "Put", "last_name": "Lock", "email": "putlock@example.com", "state": "WA"}
+    contact_id = client.post("/contacts/", json=contact).json()["id"]
+    assert client.put(f"/contacts/{contact_id}", json={**contact, "city": "Tacoma", "version": 1}).json()["version"] == 2
+
+    stale = client.put(f"/contacts/{contact_id}", json={**contact, "city": "Olympia", "version": 1})
+    assert stale.status_code == 409
+    assert stale.json()["detail"]["current_version"] == 2
+
+    # Escritura concurrente: otra transacción incrementa la versión entre la lectura y el UPDATE
+    pending = [True]
+
+    def concurrent_write(session, flush_context, instances):
+        if pending:
+            pending.pop()
+            session.connection().execute(text("UPDATE contacts SET version = version + 1 WHERE id = :id"), {"id": contact_id})
+
+    event.listen(Session, "before_flush", concurrent_write)
+    try:
+        raced = client.put(f"/contacts/{contact_id}", json={**contact, "city": "Spokane"})
+    finally:
+        event.remove(Session, "before_flush", concurrent_write)
+    assert raced.status_code == 409
+    # El rollback descarta también la escritura simulada: la versión actual sigue siendo 2
+    assert raced.json()["detail"]["current_version"] == 2
+    assert client.get(f"/contacts/{contact_id}").json()["city"] == "Tacoma"
+
+def test_patch_contact_validation(client):
+    """Prueba que PATCH rechace borrar campos obligatorios, emails duplicados y contactos inexistentes."""
+    client.post("/contacts/", json={"first_name": "A", "last_name": "A", "email": "a@example.com", "state": "NY"})
+    contact_id = client.post(
+        "/contacts/", json={"first_name": "B", "last_name": "B", "email": "b@example.com", "state": "NY"}
+    ).json()["id"]
+
+    assert client.patch(f"/contacts/{contact_id}", json={"last_name": None}).status_code == 422
+    assert client.patch(f"/contacts/{contact_id}", json={"email": "a@example.com"}).status_code == 400
+    assert client.patch("/contacts/999", json={"city": "X"}).status_code == 404
+    assert client.patch(f"/contacts/{contact_id}", json={"company_name": None}).json()["company_name"] is None
+
+def test_stats_updated_incrementally(client):
+    """Prueba que /stats refleje altas, cambios de estado y departamentos, y la carga masiva."""
+    base = {"first_name": "Stat", "last_name": "User", "state": "CA"}
+    first = client.post("/contacts/", json={**base, "email": "s1@example.com", "departments": ["Sales", "Support"]}).json()
+    client.post("/contacts/", json={**base, "email": "s2@example.com", "departments": ["Sales"]})
+    client.patch(f"/contacts/{first['id']}", json={"state": "NV", "departments": ["Support", "Finance"]})
+    rows = "\n".join(json.dumps({**base, "email": f"bulk{i}@example.com", "state": "TX", "departments": ["Finance"]})
+                     for i in range(3))
+    client.post("/contacts/bulk", content=rows, headers={"Content-Type": "application/x-ndjson"})
+
+    assert client.get("/stats/states").json() == [
+        {"state": "CA", "contacts": 1}, {"state": "NV", "contacts": 1}, {"state": "TX", "contacts": 3},
+    ]
+    assert client.get("/stats/departments").json() == [
+        {"department": "Finance", "contacts": 4}, {"department": "Sales", "contacts": 1},
+        {"department": "Support", "contacts": 1},
+    ]
+
+def test_stats_rebuild(db_session):
+    """Prueba que la reconstrucción completa repare conteos desactualizados."""
+    from app import crud, models, schemas, stats
+
+    for index, state in enumerate(["CA", "CA", "NY"]):
+        crud.create_contact(db_session, schemas.ContactCreate(
+            first_name="R", last_name="B", email=f"rebuild{index}@example.com", state=state, departments=["Ops"]
+        ))
+    db_session.query(models.StateStats).update({"contact_count": 99})
+    db_session.commit()
+
+    stats.rebuild(bind=db_session.get_bind())
+    db_session.expire_all()
+    assert crud.get_state_stats(db_session) == [{"state": "CA", "contacts": 2}, {"state": "NY", "contacts": 1}]
+    assert crud.get_department_stats(db_session) == [{"department": "Ops", "contacts": 3}]
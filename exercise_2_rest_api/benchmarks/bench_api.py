@@ -0,0 +1,321 @@
+"""
+Benchmark reproducible de todos los endpoints de contactos. Cada escenario corre durante un tiempo fijo con
+N clientes concurrentes y reporta throughput, latencias (p50/p95/p99), errores y consultas SQL por request
+(a partir de GET /metrics, antes y después del escenario). El escenario "mixed" combina todos a la vez.
+Los resultados se guardan en JSON para comparar corridas en el tiempo.
+
+    # 1. Datos: ver benchmarks/seed_contacts.py (SQLite o el Postgres de docker-compose)
+    python benchmarks/seed_contacts.py --database-url sqlite:///./bench.db --contacts 100000 --reset
+
+    # 2. API contra la misma base de datos (desde exercise_2_rest_api/)
+    DATABASE_URL=sqlite:///./bench.db uvicorn api.main:app --port 8000
+
+    # 3. Benchmark, y comparación contra una corrida anterior
+    python benchmarks/bench_api.py --label sqlite-100k --concurrency 50 --duration 10
+    python benchmarks/bench_api.py --label sqlite-100k --compare benchmarks/results/<anterior>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+from bench_concurrency import percentil
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# Escenario -> (método, plantilla(s) de ruta con la que /metrics etiqueta el endpoint)
+ESCENARIOS = {
+    "list": ("GET", "/contacts/"),
+    "list_cursor": ("GET", "/contacts/"),
+    "list_filtered": ("GET", "/contacts/"),
+    "get": ("GET", "/contacts/{contact_id}"),
+    "get_not_modified": ("GET", "/contacts/{contact_id}"),
+    "search": ("GET", "/contacts/search"),
+    "export": ("GET", "/contacts/export"),
+    "stats": ("GET", ("/stats/departments", "/stats/states")),
+    "create": ("POST", "/contacts/"),
+    "update": ("PUT", "/contacts/{contact_id}"),
+    "patch": ("PATCH", "/contacts/{contact_id}"),
+    "bulk": ("POST", "/contacts/bulk"),
+    "mixed": (None, None),
+}
+# Peso de cada escenario dentro de "mixed" (tráfico dominado por lecturas)
+PESOS_MIXED = {
+    "list": 10, "list_cursor": 10, "list_filtered": 10, "get": 40, "get_not_modified": 10,
+    "search": 10, "export": 1, "stats": 2, "create": 4, "update": 2, "patch": 2, "bulk": 1,
+}
+
+
+# === Preparación: datos de referencia tomados de la API ===
+
+async def _ultimo_id(http):
+    """Mayor id existente, por búsqueda exponencial + binaria sobre GET /contacts/{id} (ids contiguos del seed)."""
+    alto = 1
+    while (await http.get(f"/contacts/{alto}")).status_code == 200:
+        alto *= 2
+    bajo = alto // 2
+    while bajo + 1 < alto:
+        medio = (bajo + alto) // 2
+        if (await http.get(f"/contacts/{medio}")).status_code == 200:
+            bajo = medio
+        else:
+            alto = medio
+    return bajo
+
+
+async def preparar(http, rng, muestras):
+    ultimo_id = await _ultimo_id(http)
+    if not ultimo_id:
+        raise SystemExit("La API no tiene contactos: ejecuta primero benchmarks/seed_contacts.py.")
+
+    contactos = []
+    for contact_id in sorted(rng.sample(range(1, ultimo_id + 1), min(muestras, ultimo_id))):
+        response = await http.get(f"/contacts/{contact_id}")
+        if response.status_code == 200:
+            contactos.append((response.json(), response.headers.get("ETag")))
+
+    # Cursores reales de GET /contacts/ para pedir páginas intermedias
+    cursores, cursor = [], None
+    for _ in range(20):
+        response = await http.get("/contacts/", params={"limit": 100, **({"cursor": cursor} if cursor else {})})
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        cursores.append(cursor)
+    return {"last_id": ultimo_id, "contacts": contactos, "cursors": cursores or [None]}
+
+
+# === Requests de cada escenario ===
+
+def _payload(contacto, email):
+    datos = {key: value for key, value in contacto.items() if key not in ("id", "departments")}
+    return {**datos, "email": email, "departments": [d["name"] for d in contacto["departments"]]}
+
+
+def construir_request(escenario, datos, rng, run_id, contador):
+    """Devuelve (método, ruta, kwargs de httpx) para una petición del escenario."""
+    contacto, etag = rng.choice(datos["contacts"])
+    if escenario == "list":
+        return "GET", "/contacts/", {"params": {"limit": 100}}
+    if escenario == "list_cursor":
+        cursor = rng.choice(datos["cursors"])
+        return "GET", "/contacts/", {"params": {"limit": 100, **({"cursor": cursor} if cursor else {})}}
+    if escenario == "list_filtered":
+        params = {"limit": 100, "state": contacto["state"]}
+        if contacto["departments"]:
+            params["department"] = rng.choice(contacto["departments"])["name"]
+        return "GET", "/contacts/", {"params": params}
+    if escenario == "get":
+        return "GET", f"/contacts/{contacto['id']}", {}
+    if escenario == "get_not_modified":
+        return "GET", f"/contacts/{contacto['id']}", {"headers": {"If-None-Match": etag or ""}}
+    if escenario == "search":
+        return "GET", "/contacts/search", {"params": {"q": contacto["last_name"][:4], "limit": 20}}
+    if escenario == "export":
+        # Cola acotada: exportar 1M de filas por request mediría el ancho de banda, no la API
+        since_id = max(datos["last_id"] - 1000, 0)
+        return "GET", "/contacts/export", {"params": {"format": "ndjson", "since_id": since_id}}
+    if escenario == "stats":
+        return "GET", rng.choice(["/stats/departments", "/stats/states"]), {}
+    if escenario == "create":
+        return "POST", "/contacts/", {"json": _payload(contacto, f"bench-{run_id}-{next(contador)}@example.com")}
+    if escenario == "update":
+        cambio = {**contacto, "first_name": f"{contacto['first_name'].split('-')[0]}-{next(contador)}"}
+        return "PUT", f"/contacts/{contacto['id']}", {"json": _payload(cambio, contacto["email"])}
+    if escenario == "patch":
+        return "PATCH", f"/contacts/{contacto['id']}", {"json": {"phone2": f"555-{next(contador) % 10000:04d}"}}
+    if escenario == "bulk":
+        filas = (
+            json.dumps(_payload(contacto, f"bench-{run_id}-{next(contador)}@example.com"))
+            for contacto, _ in rng.sample(datos["contacts"], min(100, len(datos["contacts"])))
+        )
+        return "POST", "/contacts/bulk", {
+            "content": "\n".join(filas), "headers": {"Content-Type": "application/x-ndjson"}
+        }
+    raise ValueError(f"Escenario desconocido: {escenario}")
+
+
+# === Consultas por request desde GET /metrics ===
+
+LINEA_METRICA = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+ETIQUETA = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+async def leer_metricas(http):
+    """{(métrica, método, ruta): valor} de los totales por request, o None si la API no expone /metrics."""
+    response = await http.get("/metrics")
+    if response.status_code != 200:
+        return None
+    valores = {}
+    for linea in response.text.splitlines():
+        coincidencia = LINEA_METRICA.match(linea)
+        if not coincidencia or not coincidencia.group(1).endswith(("_sum", "_count")):
+            continue
+        etiquetas = dict(ETIQUETA.findall(coincidencia.group(2)))
+        if "route" in etiquetas and "le" not in etiquetas:
+            clave = (coincidencia.group(1), etiquetas.get("method"), etiquetas["route"])
+            valores[clave] = valores.get(clave, 0.0) + float(coincidencia.group(3))
+    return valores
+
+
+def consultas_por_request(antes, despues, metodo, ruta):
+    if antes is None or despues is None:
+        return None, None
+
+    rutas = ruta if isinstance(ruta, tuple) else (ruta,)
+
+    def delta(metrica):
+        return sum(
+            valor - antes.get(clave, 0.0) for clave, valor in despues.items()
+            if clave[0] == metrica and (metodo is None or (clave[1] == metodo and clave[2] in rutas))
+            and clave[2] != "/metrics"
+        )
+
+    requests = delta("http_request_db_queries_count")
+    if not requests:
+        return None, None
+    return (round(delta("http_request_db_queries_sum") / requests, 2),
+            round(delta("http_request_db_seconds_sum") / requests * 1000, 3))
+
+
+# === Ejecución ===
+
+async def cliente(http, escenario, datos, rng, run_id, contador, fin, latencias, errores):
+    escenarios = list(PESOS_MIXED)
+    pesos = list(PESOS_MIXED.values())
+    while time.perf_counter() < fin:
+        actual = rng.choices(escenarios, pesos)[0] if escenario == "mixed" else escenario
+        metodo, ruta, kwargs = construir_request(actual, datos, rng, run_id, contador)
+        inicio = time.perf_counter()
+        try:
+            response = await http.request(metodo, ruta, **kwargs)
+            await response.aread()
+            if response.status_code >= 400:
+                errores.append(response.status_code)
+                continue
+        except httpx.HTTPError as exc:
+            errores.append(type(exc).__name__)
+            continue
+        latencias.append(time.perf_counter() - inicio)
+
+
+async def ejecutar_escenario(args, http, escenario, datos, rng, run_id, contador):
+    metodo, ruta = ESCENARIOS[escenario]
+    antes = await leer_metricas(http)
+    latencias, errores = [], []
+    inicio = time.perf_counter()
+    fin = inicio + args.duration
+    await asyncio.gather(*(
+        cliente(http, escenario, datos, random.Random(rng.random()), run_id, contador, fin, latencias, errores)
+        for _ in range(args.concurrency)
+    ))
+    transcurrido = time.perf_counter() - inicio
+    queries, db_ms = consultas_por_request(antes, await leer_metricas(http), metodo, ruta)
+
+    return {
+        "requests": len(latencias),
+        "errors": len(errores),
+        "error_codes": sorted({str(error) for error in errores}),
+        "rps": round(len(latencias) / transcurrido, 1),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2) if latencias else None,
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2) if latencias else None,
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2) if latencias else None,
+        "mean_ms": round(statistics.mean(latencias) * 1000, 2) if latencias else None,
+        "queries_per_request": queries,
+        "db_ms_per_request": db_ms,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual, anterior):
+    """Imprime la variación de rps y p95 de cada escenario respecto de una corrida anterior."""
+    print(f"\nComparación con {anterior['meta'].get('label')} ({anterior['meta'].get('timestamp')}):")
+    print(f"{'escenario':<18}{'rps':>10}{'Δ rps':>9}{'p95 ms':>10}{'Δ p95':>9}{'queries':>9}")
+    for escenario, resultado in actual["results"].items():
+        previo = anterior["results"].get(escenario)
+        if not previo:
+            continue
+
+        def variacion(clave):
+            if not previo.get(clave) or resultado.get(clave) is None:
+                return "-"
+            return f"{(resultado[clave] / previo[clave] - 1) * 100:+.1f}%"
+
+        print(f"{escenario:<18}{resultado['rps']:>10}{variacion('rps'):>9}{str(resultado['p95_ms']):>10}"
+              f"{variacion('p95_ms'):>9}{str(resultado['queries_per_request']):>9}")
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    run_id = uuid.uuid4().hex[:8]
+    contador = iter(range(1, 10 ** 12))
+    limites = httpx.Limits(max_connections=args.concurrency + 1, max_keepalive_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=60) as http:
+        datos = await preparar(http, rng, args.sample_contacts)
+        print(f"{datos['last_id']} contactos; {len(datos['contacts'])} de muestra")
+
+        resultados = {}
+        for escenario in args.scenarios:
+            resultados[escenario] = await ejecutar_escenario(args, http, escenario, datos, rng, run_id, contador)
+            print(json.dumps({"scenario": escenario, **resultados[escenario]}))
+
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    reporte = {
+        "meta": {
+            "timestamp": timestamp,
+            "label": args.label,
+            "url": args.url,
+            "git_commit": _git_commit(),
+            "contacts": datos["last_id"],
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "seed": args.seed,
+            "python": platform.python_version(),
+        },
+        "results": resultados,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{timestamp}-{args.label}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(reporte, f, indent=2)
+    print(f"Resultados guardados en {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            comparar(reporte, json.load(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--label", default="local", help="Nombre de la corrida (p. ej. sqlite-100k, postgres-1m).")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por escenario.")
+    parser.add_argument("--scenarios", nargs="+", choices=list(ESCENARIOS), default=list(ESCENARIOS))
+    parser.add_argument("--sample-contacts", type=int, default=200, help="Contactos de referencia para los requests.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Ruta del JSON (por defecto benchmarks/results/<timestamp>-<label>.json).")
+    parser.add_argument("--compare", help="JSON de una corrida anterior para mostrar la variación.")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
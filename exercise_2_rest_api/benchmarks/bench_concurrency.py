@@ -0,0 +1,93 @@
+"""
+Benchmark de concurrencia de la API: N clientes concurrentes hacen peticiones durante un tiempo fijo
+y se reportan peticiones por segundo, latencias (p50/p95/p99) y errores por nivel de concurrencia.
+
+Sirve para comparar DB_MODE=sync (threadpool de FastAPI, 40 hilos) contra DB_MODE=async (AsyncSession):
+levantar la API en cada modo y correr el mismo benchmark.
+
+    DB_MODE=sync  uvicorn app.main:app --port 8000
+    python benchmarks/bench_concurrency.py --url http://localhost:8000 --concurrency 10 50 100 200 400
+
+    DB_MODE=async uvicorn app.main:app --port 8000
+    python benchmarks/bench_concurrency.py --url http://localhost:8000 --concurrency 10 50 100 200 400
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+import httpx
+
+
+def percentil(valores, p):
+    if not valores:
+        return None
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))]
+
+
+async def cliente(http, rutas, fin, latencias, errores):
+    while time.perf_counter() < fin:
+        ruta = random.choice(rutas)
+        inicio = time.perf_counter()
+        try:
+            response = await http.get(ruta)
+            if response.status_code >= 500:
+                errores.append(response.status_code)
+                continue
+        except httpx.HTTPError as exc:
+            errores.append(type(exc).__name__)
+            continue
+        latencias.append(time.perf_counter() - inicio)
+
+
+async def ejecutar_nivel(url, rutas, concurrencia, duracion):
+    latencias, errores = [], []
+    limites = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    async with httpx.AsyncClient(base_url=url, limits=limites, timeout=30) as http:
+        fin = time.perf_counter() + duracion
+        await asyncio.gather(*(cliente(http, rutas, fin, latencias, errores) for _ in range(concurrencia)))
+
+    return {
+        "concurrency": concurrencia,
+        "requests": len(latencias),
+        "errors": len(errores),
+        "rps": round(len(latencias) / duracion, 1),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 2) if latencias else None,
+        "p95_ms": round(percentil(latencias, 95) * 1000, 2) if latencias else None,
+        "p99_ms": round(percentil(latencias, 99) * 1000, 2) if latencias else None,
+        "mean_ms": round(statistics.mean(latencias) * 1000, 2) if latencias else None,
+    }
+
+
+async def main_async(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as http:
+        ids = [contact["id"] for contact in (await http.get("/contacts/", params={"limit": 1000})).json()]
+    if not ids:
+        raise SystemExit("La API no tiene contactos: ejecuta primero la ingesta.")
+
+    rutas = [f"/contacts/{contact_id}" for contact_id in ids] + ["/contacts/?limit=100"]
+    resultados = []
+    for concurrencia in args.concurrency:
+        resultado = await ejecutar_nivel(args.url, rutas, concurrencia, args.duration)
+        resultados.append(resultado)
+        print(json.dumps(resultado))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"url": args.url, "duration": args.duration, "results": resultados}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[10, 50, 100, 200, 400])
+    parser.add_argument("--duration", type=float, default=10.0, help="Segundos por nivel de concurrencia.")
+    parser.add_argument("--output", help="Ruta opcional para guardar los resultados en JSON.")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
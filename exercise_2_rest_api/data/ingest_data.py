@@ -1,6 +1,7 @@
 import pandas as pd
 from sqlalchemy import create_engine, text
 from sqlalchemy.exc import OperationalError
+import os
 import sys
 import time
 
@@ -45,13 +46,19 @@ while retry_count < MAX_RETRIES:
             # --- 4. Procesar Contactos Únicos ---
             contacts_df = df.drop_duplicates(subset=['email'], keep='first').drop(columns=['department'])
             contacts_df.to_sql('temp_contacts', connection, if_exists='replace', index=False)
+            # Un contacto existente que cambia incrementa su version (bloqueo optimista de PUT/PATCH);
+            # los que llegan iguales no se reescriben, así los clientes que tienen su versión no reciben 409.
             connection.execute(text("""
                 INSERT INTO contacts (first_name, last_name, company_name, email, address, city, state, zip, phone1, phone2)
                 SELECT first_name, last_name, company_name, email, address, city, state, zip, phone1, phone2 FROM temp_contacts
                 ON CONFLICT (email) DO UPDATE SET
                     first_name = EXCLUDED.first_name, last_name = EXCLUDED.last_name, company_name = EXCLUDED.company_name,
                     address = EXCLUDED.address, city = EXCLUDED.city, state = EXCLUDED.state, zip = EXCLUDED.zip,
-                    phone1 = EXCLUDED.phone1, phone2 = EXCLUDED.phone2;
+                    phone1 = EXCLUDED.phone1, phone2 = EXCLUDED.phone2, version = contacts.version + 1
+                WHERE (contacts.first_name, contacts.last_name, contacts.company_name, contacts.address, contacts.city,
+                       contacts.state, contacts.zip, contacts.phone1, contacts.phone2)
+                    IS DISTINCT FROM (EXCLUDED.first_name, EXCLUDED.last_name, EXCLUDED.company_name, EXCLUDED.address,
+                                      EXCLUDED.city, EXCLUDED.state, EXCLUDED.zip, EXCLUDED.phone1, EXCLUDED.phone2);
             """))
             print(f"{len(contacts_df)} contactos únicos insertados/actualizados.")
 
@@ -77,6 +84,20 @@ while retry_count < MAX_RETRIES:
                 """))
             print(f"{len(associations)} asociaciones contacto-departamento procesadas.")
 
+            # --- 6. Recalcular las tablas resumen de /stats (la ingesta no pasa por la API) ---
+            connection.execute(text("LOCK TABLE state_contact_counts, department_contact_counts IN EXCLUSIVE MODE;"))
+            connection.execute(text("DELETE FROM state_contact_counts;"))
+            connection.execute(text("DELETE FROM department_contact_counts;"))
+            connection.execute(text("""
+                INSERT INTO state_contact_counts (state, contact_count)
+                SELECT state, COUNT(*) FROM contacts GROUP BY state;
+            """))
+            connection.execute(text("""
+                INSERT INTO department_contact_counts (department_id, contact_count)
+                SELECT department_id, COUNT(*) FROM contact_department_association GROUP BY department_id;
+            """))
+            print("Tablas resumen de /stats recalculadas.")
+
             break
 
     except OperationalError:
@@ -87,10 +108,23 @@ while retry_count < MAX_RETRIES:
         print(f"Ocurrió un error inesperado durante la ingesta: {e}")
         sys.exit(1)
 
-# --- 6. Verificación Final ---
+# --- 7. Verificación Final ---
 if retry_count == MAX_RETRIES:
     print("\nNo se pudo establecer conexión con la base de datos después de varios intentos. Abortando.")
     print("Posibles causas: el contenedor 'db' no está corriendo o la API (que crea las tablas) no ha arrancado correctamente.")
     sys.exit(1)
 
+# --- 8. Vaciar el caché de GET /contacts/{id} ---
+# La ingesta no pasa por la API, así que las entradas cacheadas (y sus ETag) quedarían desactualizadas.
+# Con el backend "redis" se borran aquí; el backend "memory" vive en cada proceso de la API y se
+# vacía reiniciándola (ingest.sh / ingest.bat lo hacen al terminar).
+if os.getenv("CONTACT_CACHE_BACKEND", "memory") == "redis":
+    import redis
+
+    cache = redis.Redis.from_url(os.getenv("REDIS_URL", "redis://redis:6379/0"))
+    deleted = 0
+    for key in cache.scan_iter(match="contacts:*"):
+        deleted += cache.delete(key)
+    print(f"Caché de contactos en Redis vaciado ({deleted} entradas).")
+
 print("\n¡Proceso de ingesta completado exitosamente!")
\ No newline at end of file
@@ -1,4 +1,6 @@
 #!/bin/bash
 echo "Ejecutando el script de ingesta de datos..."
 docker-compose run --rm ingestor
+# El caché en memoria de GET /contacts/{id} no ve los cambios de la ingesta: se vacía reiniciando la API
+docker-compose restart api
 echo "Ingesta de datos completada."
\ No newline at end of file